@@ -0,0 +1,107 @@
+import atexit
+import threading
+from datetime import datetime, timedelta
+
+from flask_login import user_loaded_from_request
+from sqlalchemy import bindparam, func
+
+from models import db, User
+
+
+class ActivityTracker:
+    """
+    Coalesced maintenance of User.last_activity.
+
+    Authenticated requests only record a touch in memory, keyed by user, so a
+    user making many requests costs one entry. A background thread writes the
+    pending touches every ACTIVITY_FLUSH_INTERVAL seconds as a single bulk
+    UPDATE, which caps the writes at one row per active user per interval and
+    keeps read-only endpoints off the database write lock.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.flush_interval = 60
+        self._pending = {}  # user ID -> latest touch
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = app.config.get('ACTIVITY_FLUSH_INTERVAL', self.flush_interval)
+        user_loaded_from_request.connect(self._on_user_loaded, app)
+        app.extensions['activity_tracker'] = self
+        atexit.register(self.stop)
+
+    def _on_user_loaded(self, sender, user=None, **kwargs):
+        if user is not None:
+            self.touch(user.id)
+
+    def touch(self, user_id, when=None):
+        """Record that a user was active; written to the database on the next flush."""
+        self._ensure_started()
+        with self._lock:
+            self._pending[user_id] = when or datetime.utcnow()
+
+    def flush(self):
+        """Write every pending touch in one bulk UPDATE."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        statement = User.__table__.update().where(
+            User.__table__.c.id == bindparam('user_id')
+        ).values(last_activity=bindparam('touched_at'))
+        with self.app.app_context():
+            try:
+                db.session.execute(statement, [
+                    {'user_id': user_id, 'touched_at': touched_at} for user_id, touched_at in pending.items()
+                ])
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error saving user activity: {e}")
+                # Keep the touches for the next flush unless newer ones arrived meanwhile
+                with self._lock:
+                    for user_id, touched_at in pending.items():
+                        self._pending.setdefault(user_id, touched_at)
+
+    def stop(self):
+        """Flush pending touches and stop the background thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._wakeup.set()
+            thread.join()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._wakeup.clear()
+                self._thread = threading.Thread(target=self._run, name='activity-tracker', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            stopping = self._wakeup.wait(self.flush_interval)
+            self.flush()
+
+
+activity_tracker = ActivityTracker()
+
+
+def active_user_count(window_seconds):
+    """
+    Count users seen in the last window_seconds.
+
+    Touches reach the database within ACTIVITY_FLUSH_INTERVAL, so the window
+    should be longer than that interval.
+    """
+    since = datetime.utcnow() - timedelta(seconds=window_seconds)
+    return db.session.query(func.count(User.id)).filter(User.last_activity >= since).scalar()
@@ -0,0 +1,213 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import bindparam, case
+
+from models import db, Quiz, Score
+
+ANOMALY_THRESHOLD = 3.5  # Robust z-score above which an attempt is flagged
+MIN_ATTEMPTS = 10  # Quizzes with fewer scored attempts are not assessed
+MAD_TO_SIGMA = 1.4826  # Scales the median absolute deviation to a standard deviation
+
+# Smallest spread assumed per feature, so a quiz where almost everyone has the
+# same value (e.g. no tab changes at all) does not turn one difference into z=inf
+MIN_SCALE = {
+    'tab_changes': 1.0,
+    'fast_completion': 0.05,  # Fraction of the quiz duration
+    'score_time_mismatch': 0.05,  # Fraction of the total marks
+}
+
+
+def _group_median(groups, values, group_count):
+    counts = np.bincount(groups, minlength=group_count)
+    medians = np.full(group_count, np.nan)
+    if not len(values):
+        return medians
+    order = np.lexsort((values, groups))
+    sorted_values = values[order]
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    present = counts > 0
+    lower = sorted_values[(starts + (counts - 1) // 2)[present]]
+    upper = sorted_values[(starts + counts // 2)[present]]
+    medians[present] = (lower + upper) / 2
+    return medians
+
+
+def robust_z(groups, values, group_count, min_scale):
+    """
+    Per-group robust z-scores, (x - median) / (1.4826 * MAD), for every value.
+
+    NaN values and groups with fewer than MIN_ATTEMPTS valid values get NaN.
+    """
+    z = np.full(len(values), np.nan)
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return z
+    valid_groups = groups[valid]
+    valid_values = values[valid]
+    median = _group_median(valid_groups, valid_values, group_count)
+    mad = _group_median(valid_groups, np.abs(valid_values - median[valid_groups]), group_count)
+    scale = np.maximum(MAD_TO_SIGMA * mad, min_scale)
+    scores = (valid_values - median[valid_groups]) / scale[valid_groups]
+    enough = np.bincount(valid_groups, minlength=group_count) >= MIN_ATTEMPTS
+    z[valid] = np.where(enough[valid_groups], scores, np.nan)
+    return z
+
+
+def _fit_residuals(groups, x, y, group_count):
+    """Residuals of a per-group least-squares line y ~ a + b * x (NaN where x or y is missing)."""
+    valid = ~(np.isnan(x) | np.isnan(y))
+    g, xv, yv = groups[valid], x[valid], y[valid]
+    n = np.bincount(g, minlength=group_count)
+    sx = np.bincount(g, weights=xv, minlength=group_count)
+    sy = np.bincount(g, weights=yv, minlength=group_count)
+    sxx = np.bincount(g, weights=xv * xv, minlength=group_count)
+    sxy = np.bincount(g, weights=xv * yv, minlength=group_count)
+    denominator = n * sxx - sx * sx
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = np.where(denominator > 0, (n * sxy - sx * sy) / denominator, 0.0)
+        intercept = np.where(n > 0, (sy - slope * sx) / n, np.nan)
+    residuals = np.full(len(x), np.nan)
+    residuals[valid] = yv - (intercept[g] + slope[g] * xv)
+    return residuals
+
+
+def compute_anomalies(quiz_ids, tab_changes, time_took, duration, scored, marks):
+    """
+    Score every attempt against the other attempts of the same quiz.
+
+    All arguments are parallel arrays (floats with NaN for missing values).
+    Three robust z-scores are computed per quiz:
+      tab_changes: more tab switches than usual.
+      fast_completion: a smaller share of the quiz duration used than usual.
+      score_time_mismatch: a higher score than the quiz's score-versus-time
+        trend predicts for that completion time.
+
+    Returns:
+      A (scores, components) tuple: the largest component of each attempt
+      (NaN when none could be computed) and a dict of component arrays.
+    """
+    _, groups = np.unique(quiz_ids, return_inverse=True)
+    group_count = groups.max() + 1 if len(groups) else 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        completion = np.where(duration > 0, time_took / duration, np.nan)
+        percentage = np.where(marks > 0, scored / marks, np.nan)
+
+    components = {
+        'tab_changes': robust_z(groups, tab_changes, group_count, MIN_SCALE['tab_changes']),
+        'fast_completion': -robust_z(groups, completion, group_count, MIN_SCALE['fast_completion']),
+        'score_time_mismatch': robust_z(
+            groups, _fit_residuals(groups, completion, percentage, group_count), group_count,
+            MIN_SCALE['score_time_mismatch'],
+        ),
+    }
+    stacked = np.stack(list(components.values()))
+    assessed = ~np.isnan(stacked).all(axis=0)
+    scores = np.full(len(quiz_ids), np.nan)
+    scores[assessed] = np.maximum(np.nanmax(stacked[:, assessed], axis=0), 0)
+    return scores, components
+
+
+def _float_column(values):
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def score_attempt_anomalies(quiz_ids=None):
+    """
+    Recompute the anomaly score of every attempt of the given quizzes (all when None).
+
+    Scores, reasons and the automatic flag are written with one bulk UPDATE.
+    Attempts an admin flagged or unflagged by hand keep their flag.
+
+    Returns:
+      A dict with the number of attempts assessed and found anomalous.
+    """
+    query = db.session.query(
+        Score.id, Score.quiz_id, Score.tab_changes, Score.time_took_to_attempt_test,
+        Score.duration_quiz, Score.total_scored, Score.total_marks,
+    ).filter(Score.quiz_id.isnot(None))
+    if quiz_ids is not None:
+        query = query.filter(Score.quiz_id.in_(quiz_ids))
+    rows = query.all()
+    if not rows:
+        return {'assessed': 0, 'anomalous': 0}
+
+    columns = list(zip(*rows))
+    scores, components = compute_anomalies(
+        np.array(columns[1], dtype=np.int64), *(_float_column(column) for column in columns[2:])
+    )
+
+    updates = []
+    for index, score_id in enumerate(columns[0]):
+        score = scores[index]
+        reasons = [
+            {'reason': name, 'z': round(float(values[index]), 2)}
+            for name, values in components.items()
+            if not np.isnan(values[index]) and values[index] >= ANOMALY_THRESHOLD
+        ]
+        updates.append({
+            'score_id': score_id,
+            'score_value': None if np.isnan(score) else round(float(score), 3),
+            'reasons': reasons,
+            'auto_flagged': bool(reasons),
+        })
+
+    table = Score.__table__
+    db.session.execute(table.update().where(table.c.id == bindparam('score_id')).values(
+        anomaly_score=bindparam('score_value'),
+        anomaly_reasons=bindparam('reasons'),
+        flagged=case((table.c.flag_source == 'manual', table.c.flagged), else_=bindparam('auto_flagged')),
+        flag_source=case((table.c.flag_source == 'manual', 'manual'), else_='auto'),
+    ), updates)
+    db.session.commit()
+    return {
+        'assessed': int(np.count_nonzero(~np.isnan(scores))),
+        'anomalous': sum(update['auto_flagged'] for update in updates),
+    }
+
+
+def parse_duration(time_duration):
+    """
+    Parse a quiz duration stored as 'H:MM' or as str(timedelta), e.g. '0:30:00'.
+
+    Raises ValueError if the value is malformed.
+    """
+    parts = (time_duration or '').split(':')
+    if len(parts) not in (2, 3):
+        raise ValueError(f"Malformed quiz duration {time_duration!r}")
+    hours, minutes, *seconds = (int(part) for part in parts)
+    return timedelta(hours=hours, minutes=minutes, seconds=seconds[0] if seconds else 0)
+
+
+def quiz_window_end(date_of_quiz, duration):
+    """
+    When the last attempt of a quiz can finish.
+
+    A quiz scheduled at a time of day ends one duration after it starts. Quizzes
+    created through the API only carry a date (stored at midnight) and can be
+    started any time that day, so they end one duration after the day is over.
+    """
+    if date_of_quiz.time() == datetime.min.time():
+        return date_of_quiz + timedelta(days=1) + duration
+    return date_of_quiz + duration
+
+
+def finished_quiz_ids(lookback, now=None):
+    """IDs of the quizzes whose window (see quiz_window_end) ended within lookback."""
+    now = now or datetime.now()
+    since = now - lookback
+    finished = []
+    # time_duration is a string, so the window end is computed here; date-only
+    # quizzes end a day after their date, hence the two-day margin
+    candidates = db.session.query(Quiz.id, Quiz.date_of_quiz, Quiz.time_duration).filter(
+        Quiz.date_of_quiz.isnot(None), Quiz.date_of_quiz <= now, Quiz.date_of_quiz >= since - timedelta(days=2)
+    )
+    for quiz_id, date_of_quiz, time_duration in candidates:
+        try:
+            duration = parse_duration(time_duration)
+        except ValueError as e:
+            print(f"Skipping anomaly scoring of quiz {quiz_id}: {e}")
+            continue
+        if since < quiz_window_end(date_of_quiz, duration) <= now:
+            finished.append(quiz_id)
+    return finished
@@ -0,0 +1,201 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from cache import current_generation, invalidate_tags
+from models import User
+
+
+class CachedRole:
+    """Read-only stand-in for a Role, enough for Flask-Security's identity loading."""
+
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def get_permissions(self):
+        return set()
+
+    def __str__(self):
+        return self.name
+
+
+class Principal:
+    """
+    Immutable snapshot of an authenticated user (ID, email and roles).
+
+    Served as current_user on a warm auth cache so that handlers and
+    roles_required never touch the User or Role tables.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user):
+        object.__setattr__(self, 'id', user.id)
+        object.__setattr__(self, 'email', user.email)
+        object.__setattr__(self, 'fs_uniquifier', user.fs_uniquifier)
+        object.__setattr__(self, 'active', bool(user.active))
+        object.__setattr__(self, 'roles', tuple(CachedRole(role.name) for role in user.roles))
+        object.__setattr__(self, '_role_names', frozenset(role.name for role in user.roles))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Principal is immutable')
+
+    @property
+    def is_active(self):
+        return self.active
+
+    def get_id(self):
+        return self.fs_uniquifier
+
+    def has_role(self, role):
+        return getattr(role, 'name', role) in self._role_names
+
+    def __str__(self):
+        return self.email
+
+
+class AuthCache:
+    """
+    Maps authentication tokens to Principals, with a TTL and LRU eviction.
+
+    Wraps the Flask-Security request loader: a miss goes through the normal
+    token verification and User lookup, a hit returns the cached Principal.
+    Entries of a user are dropped as soon as a commit changes their roles,
+    'active' flag or fs_uniquifier (which also revokes their tokens). Each entry
+    is also stamped with the shared 'auth:<user_id>' tag generation, checked on
+    every hit, so a change committed by another worker process takes effect
+    immediately there too.
+    """
+
+    def __init__(self, app=None):
+        self.max_size = 10000
+        self.ttl = 300
+        self._entries = OrderedDict()  # token -> (expires_at, generation, principal)
+        self._tokens_by_user = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_size = app.config.get('AUTH_CACHE_SIZE', self.max_size)
+        self.ttl = app.config.get('AUTH_CACHE_TTL', self.ttl)
+        self.header_key = app.config.get('SECURITY_TOKEN_AUTHENTICATION_HEADER', 'Authentication-Token')
+        self.args_key = app.config.get('SECURITY_TOKEN_AUTHENTICATION_KEY', 'auth_token')
+
+        login_manager = app.login_manager
+        loader = login_manager._request_callback
+        login_manager.request_loader(lambda req: self.load(req, loader))
+        app.extensions['auth_cache'] = self
+
+    def load(self, req, loader):
+        token = req.args.get(self.args_key, req.headers.get(self.header_key))
+        if not token:
+            return loader(req)
+
+        principal = self.get(token)
+        if principal is not None:
+            _mark_token_authenticated()
+            return principal
+
+        user = loader(req)
+        if user is not None and getattr(user, 'is_authenticated', False):
+            # Read before the user was loaded, a change committed meanwhile
+            # leaves the entry stale on its first use
+            self.put(token, Principal(user), current_generation(_auth_tag(user.id)))
+        return user
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, generation, principal = entry
+            if expires_at < time.monotonic():
+                self._discard(token)
+                return None
+        # Without a shared generation the entry cannot be verified, so it is reloaded
+        if generation is None or current_generation(_auth_tag(principal.id)) != generation:
+            with self._lock:
+                if self._entries.get(token) is entry:
+                    self._discard(token)
+            return None
+        with self._lock:
+            if token in self._entries:
+                self._entries.move_to_end(token)
+        return principal
+
+    def put(self, token, principal, generation=None):
+        with self._lock:
+            self._discard(token)
+            self._entries[token] = (time.monotonic() + self.ttl, generation, principal)
+            self._tokens_by_user.setdefault(principal.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        """Drop every cached token of a user, in this process and (through the shared generation) in others."""
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._discard(token)
+        invalidate_tags(_auth_tag(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def _discard(self, token):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            tokens = self._tokens_by_user.get(entry[2].id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_user[entry[2].id]
+
+
+def _auth_tag(user_id):
+    return f'auth:{user_id}'
+
+
+def _mark_token_authenticated():
+    # Newer Flask-Security versions track how the request was authenticated
+    try:
+        from flask_security.utils import set_request_attr
+    except ImportError:
+        return
+    set_request_attr('fs_authn_via', 'token')
+
+
+auth_cache = AuthCache()
+
+AUTH_ATTRIBUTES = ('active', 'roles', 'fs_uniquifier')
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_auth_changes(session, flush_context, instances):
+    changed = session.info.setdefault('auth_changed_user_ids', set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if obj in session.deleted or any(
+                state.attrs[name].history.has_changes() for name in AUTH_ATTRIBUTES
+            ):
+                changed.add(obj.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_auth_changes(session):
+    for user_id in session.info.pop('auth_changed_user_ids', ()):
+        auth_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_auth_changes(session):
+    session.info.pop('auth_changed_user_ids', None)
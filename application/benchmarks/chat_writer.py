@@ -0,0 +1,60 @@
+"""
+Chat persistence throughput: one commit per message versus the write-behind ChatWriter.
+
+Run from the repository: python application/benchmarks/chat_writer.py [messages]
+"""
+import sys
+import time
+
+from common import bootstrap, percentile
+
+
+def synchronous(app, count, sender_id, recipient_id):
+    from datetime import datetime
+    from models import db, ChatMessage
+
+    latencies = []
+    with app.app_context():
+        for index in range(count):
+            started = time.perf_counter()
+            db.session.add(ChatMessage(sender_id=sender_id, recipient_id=recipient_id,
+                                       message=f'sync {index}', timestamp=datetime.utcnow()))
+            db.session.commit()
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def write_behind(app, count, sender_id, recipient_id):
+    from chat_writer import ChatWriter
+
+    writer = ChatWriter(app)
+    latencies = []
+    for index in range(count):
+        started = time.perf_counter()
+        writer.enqueue(sender_id, recipient_id, f'batched {index}', room='bench')
+        latencies.append(time.perf_counter() - started)
+    writer.stop()  # Returns once every queued message is stored
+    return latencies
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    app = bootstrap()
+    from models import db, ChatMessage
+
+    with app.app_context():
+        stored_before = db.session.query(ChatMessage).count()
+    print(f"{count} messages, single sender")
+    for name, run in (('commit per message', synchronous), ('write-behind', write_behind)):
+        started = time.perf_counter()
+        latencies = run(app, count, 1, 2)
+        elapsed = time.perf_counter() - started
+        print(f"  {name:<20} {count / elapsed:>9.0f} msg/s stored   "
+              f"handler p50 {percentile(latencies, 50) * 1e6:>7.0f} us   p99 {percentile(latencies, 99) * 1e6:>7.0f} us")
+    with app.app_context():
+        stored = db.session.query(ChatMessage).count() - stored_before
+    print(f"  stored {stored} of {2 * count} messages")
+
+
+if __name__ == '__main__':
+    main()
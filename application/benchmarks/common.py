@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def bootstrap():
+    """
+    Import the application on a throwaway SQLite database with the sample data.
+
+    Set DATABASE_URL to benchmark another database instead.
+    """
+    sys.path.insert(0, APP_DIR)
+    os.chdir(APP_DIR)
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    os.environ.setdefault('CACHE_TYPE', 'SimpleCache')
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+    from main import app
+    from sample_data import initialize_sample_data
+    initialize_sample_data()
+    return app
+
+
+def percentile(samples, percent):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def timed(function, *args, **kwargs):
+    """Run function and return (result, elapsed seconds)."""
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
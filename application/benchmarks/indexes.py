@@ -0,0 +1,101 @@
+"""
+Hot foreign-key lookups against table size, before and after the migration indexes.
+
+Builds the schema on throwaway SQLite databases, drops every secondary index,
+times the lookups, then applies the index migrations and times them again.
+
+Run from the repository: python application/benchmarks/indexes.py [rows ...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from common import APP_DIR
+
+sys.path.insert(0, APP_DIR)
+
+from sqlalchemy import create_engine, select
+
+from migrations import add_chat_participant_indexes, add_foreign_key_indexes
+from models import db, ChatMessage, Question, Score
+
+REPEATS = 200
+
+
+def populate(connection, rows):
+    users, quizzes = max(1, rows // 20), max(1, rows // 50)
+    start = datetime(2024, 1, 1)
+    connection.execute(Score.__table__.insert(), [
+        {'user_id': random.randrange(users), 'quiz_id': random.randrange(quizzes), 'total_scored': random.randrange(10)}
+        for _ in range(rows)
+    ])
+    connection.execute(Question.__table__.insert(), [
+        {'quiz_id': random.randrange(quizzes), 'question_statement': 'Q', 'correct_option': 1}
+        for _ in range(rows // 10)
+    ])
+    connection.execute(ChatMessage.__table__.insert(), [
+        {'sender_id': random.randrange(users), 'recipient_id': random.randrange(users), 'message': 'm',
+         'timestamp': start + timedelta(seconds=index)}
+        for index in range(rows)
+    ])
+    return users, quizzes
+
+
+def lookups(users, quizzes):
+    score, question, message = Score.__table__.c, Question.__table__.c, ChatMessage.__table__.c
+    return {
+        "user's attempts at a quiz": lambda: select(score.id).where(
+            score.user_id == random.randrange(users), score.quiz_id == random.randrange(quizzes)),
+        'attempts of a quiz': lambda: select(score.id).where(score.quiz_id == random.randrange(quizzes)),
+        'questions of a quiz': lambda: select(question.id).where(question.quiz_id == random.randrange(quizzes)),
+        'chat history page': lambda: select(message.id).where(
+            message.sender_id == random.randrange(users)).order_by(message.id.desc()).limit(50),
+    }
+
+
+def time_lookups(connection, statements):
+    timings = {}
+    for name, statement in statements.items():
+        started = time.perf_counter()
+        for _ in range(REPEATS):
+            connection.execute(statement()).all()
+        timings[name] = (time.perf_counter() - started) / REPEATS
+    return timings
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [10000, 100000, 500000]
+    random.seed(0)
+    print(f"{'rows':>8}  {'lookup':<26} {'no index':>12} {'indexed':>12} {'speed-up':>9}")
+    engines = []
+    # The migrations attach their Index objects to the model tables, so every
+    # schema is created before the first migration runs
+    for rows in sizes:
+        engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+        db.metadata.create_all(engine)
+        engines.append((rows, engine))
+
+    for rows, engine in engines:
+        with engine.begin() as connection:
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.drop(bind=connection, checkfirst=True)
+            statements = lookups(*populate(connection, rows))
+        with engine.connect() as connection:
+            before = time_lookups(connection, statements)
+        with engine.begin() as connection:
+            add_foreign_key_indexes(connection)
+            add_chat_participant_indexes(connection)
+        with engine.connect() as connection:
+            after = time_lookups(connection, statements)
+        for name in statements:
+            print(f"{rows:>8}  {name:<26} {before[name] * 1e3:>9.3f} ms {after[name] * 1e3:>9.3f} ms "
+                  f"{before[name] / after[name]:>8.0f}x")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Login burst: p50/p99 login latency and the latency of another endpoint meanwhile,
+with hashing inline on the request thread versus on the bounded hashing pool.
+
+Run from the repository: python application/benchmarks/login_load.py [logins] [concurrency]
+"""
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import bootstrap, percentile
+
+CREDENTIALS = {'email': 'admin@example.com', 'password': 'adminpassword'}
+
+
+def burst(app, logins, concurrency):
+    client = app.test_client()
+    token = client.post('/api/login', json=CREDENTIALS).get_json()['token']
+    headers = {'Authentication-Token': token}
+    stop = threading.Event()
+    probe_latencies = []
+
+    def probe():
+        probe_client = app.test_client()
+        while not stop.is_set():
+            started = time.perf_counter()
+            probe_client.get('/api/subjects', headers=headers)
+            probe_latencies.append(time.perf_counter() - started)
+            time.sleep(0.005)
+
+    def login(_):
+        started = time.perf_counter()
+        status = app.test_client().post('/api/login', json=CREDENTIALS).status_code
+        return status, time.perf_counter() - started
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    prober.join()
+
+    latencies = [latency for status, latency in results if status == 200]
+    shed = sum(1 for status, _ in results if status == 503)
+    return elapsed, latencies, shed, probe_latencies
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    app = bootstrap()
+    from hashing import password_hasher
+
+    print(f"{logins} logins, {concurrency} concurrent, hashing pool of {password_hasher.workers} "
+          f"with queue depth {password_hasher.queue_depth}")
+    pool = password_hasher._executor
+    for name, executor in (('inline', None), ('hashing pool', pool)):
+        password_hasher._executor = executor
+        elapsed, latencies, shed, probes = burst(app, logins, concurrency)
+        print(f"  {name:<13} {len(latencies) / elapsed:>6.1f} logins/s   "
+              f"login p50 {percentile(latencies, 50) * 1e3:>7.1f} ms  p99 {percentile(latencies, 99) * 1e3:>7.1f} ms   "
+              f"shed {shed:>4}   other endpoint p50 {percentile(probes, 50) * 1e3:>6.1f} ms  "
+              f"p99 {percentile(probes, 99) * 1e3:>6.1f} ms")
+    password_hasher._executor = pool
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Reminder jobs at scale: time, statements, ORM objects and peak memory for N users.
+
+Users are added in bulk up to each size and both jobs run for a fresh period;
+a rerun of the same period checks that nothing is sent twice.
+
+Run from the repository: python application/benchmarks/reminders.py [users ...]
+"""
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from common import bootstrap
+
+INSERT_CHUNK = 10000
+
+
+def add_users(first_id, last_id, role_id, quiz_ids):
+    from models import db, User, Score, roles_users
+
+    now = datetime.utcnow()
+    for start in range(first_id, last_id, INSERT_CHUNK):
+        ids = range(start, min(start + INSERT_CHUNK, last_id))
+        db.session.execute(User.__table__.insert(), [{
+            'id': user_id, 'email': f'bench{user_id}@example.com', 'password': 'x', 'active': True,
+            'fs_uniquifier': f'bench-{user_id}', 'full_name': f'User {user_id}',
+            'last_activity': now - timedelta(days=random.randrange(30)),
+        } for user_id in ids])
+        db.session.execute(roles_users.insert(), [{'user_id': user_id, 'role_id': role_id} for user_id in ids])
+        db.session.execute(Score.__table__.insert(), [{
+            'user_id': user_id, 'quiz_id': random.choice(quiz_ids), 'total_scored': random.randrange(5),
+            'total_marks': 5, 'time_stamp_of_attempt': now - timedelta(days=random.randrange(60)),
+        } for user_id in ids if user_id % 2])
+        db.session.commit()
+
+
+def run_job(engine, job):
+    statements = []
+    loaded = []
+
+    def count_statement(*args):
+        statements.append(1)
+
+    def count_load(target, context):
+        loaded.append(1)
+
+    from models import User
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    event.listen(User, 'load', count_load)
+    try:
+        started = time.perf_counter()
+        sent = job()
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+        event.remove(User, 'load', count_load)
+    return sent, elapsed, len(statements), len(loaded)
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [10000, 100000]
+    random.seed(0)
+    app = bootstrap()
+    app.config['REMINDER_NOTIFIER'] = 'file'
+    app.config['REMINDER_OUTBOX'] = os.path.join(tempfile.mkdtemp(), 'reminders.jsonl')
+    from models import db, Role, Quiz, User
+    from reminders import daily_recipients, monthly_recipients, daily_message, monthly_message, send_reminders
+
+    print(f"chunk size {app.config['REMINDER_CHUNK_SIZE']}")
+    print(f"{'users':>8}  {'job':<14} {'sent':>8} {'seconds':>8} {'statements':>11} {'ORM users':>10} {'peak RSS':>9}")
+    with app.app_context():
+        engine = db.engine
+        role_id = Role.query.filter_by(name='user').one().id
+        quiz_ids = [quiz_id for quiz_id, in db.session.query(Quiz.id)]
+        next_id = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+        for index, users in enumerate(sizes):
+            add_users(next_id, users + 1, role_id, quiz_ids)
+            next_id = users + 1
+            db.session.expunge_all()
+            day = (datetime(2024, 1, 1) + timedelta(days=index)).strftime('%Y-%m-%d')
+            month = f'2023-{index % 12 + 1:02d}'
+            jobs = (
+                ('daily', lambda: send_reminders('daily', day, daily_recipients(day), daily_message)),
+                ('monthly', lambda: send_reminders('monthly', month, monthly_recipients(month),
+                                                   lambda row: monthly_message(row, month))),
+                ('daily rerun', lambda: send_reminders('daily', day, daily_recipients(day), daily_message)),
+            )
+            for name, job in jobs:
+                sent, elapsed, statements, loaded = run_job(engine, job)
+                peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+                print(f"{users:>8}  {name:<14} {sent:>8} {elapsed:>8.2f} {statements:>11} {loaded:>10} {peak:>7.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,155 @@
+import threading
+import uuid
+from functools import wraps
+
+from flask import request, make_response
 from flask_caching import Cache
-cache = Cache() 
\ No newline at end of file
+from flask_security import current_user
+
+cache = Cache()
+
+# Per-process counters, exposed through AdminCacheStatsResource
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'errors': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def _backend_evictions():
+    # Redis counts the keys it evicted under memory pressure (server-wide); other backends do not
+    client = getattr(cache.cache, '_read_client', None)
+    if client is None:
+        return None
+    try:
+        return client.info('stats').get('evicted_keys')
+    except Exception:
+        return None
+
+
+def cache_stats():
+    """
+    Return a snapshot of the hit, miss, invalidation and error counters.
+
+    'evictions' is the backend's own count of keys dropped for memory, or None
+    when the backend does not report one (e.g. SimpleCache). Invalidations are
+    counted separately: they retire entries by replacing a tag generation and
+    never remove them.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['evictions'] = _backend_evictions()
+    return stats
+
+
+def _tag_key(tag):
+    return f'tag:{tag}'
+
+
+def tag_generations(tags):
+    """
+    Return the current generation of each tag.
+
+    A tag without a generation, because it was never invalidated or because
+    the backend dropped the key, gets a fresh random one. A lost generation
+    therefore never comes back as an earlier value, so entries built under it
+    stay unreachable.
+    """
+    if not tags:
+        return []
+    keys = [_tag_key(tag) for tag in tags]
+    generations = list(cache.get_many(*keys))
+    for i, (key, generation) in enumerate(zip(keys, generations)):
+        if generation is None:
+            generation = uuid.uuid4().hex
+            # Another worker may have initialised the tag first; use its generation
+            if not cache.add(key, generation, timeout=0):
+                generation = cache.get(key) or generation
+            generations[i] = generation
+    return generations
+
+
+def current_generation(tag):
+    """
+    Return the shared generation of a single tag, or None if the backend is unavailable.
+
+    In-process caches (the catalog snapshot, answer keys, authenticated
+    principals) stamp their entries with it and compare it on every read, so
+    an invalidation made by any worker process reaches them. None never
+    matches: callers must treat it as a miss.
+    """
+    try:
+        return tag_generations([tag])[0]
+    except Exception:
+        _count('errors')
+        return None
+
+
+def invalidate_tags(*tags):
+    """
+    Invalidate every cached response carrying one of the given tags.
+
+    Each tag has a generation that is part of the cache key, so replacing it
+    makes all entries built under the old generation unreachable; they are
+    then left to expire on their own. Generations are random rather than
+    counters so that an entry can never become reachable again after a
+    generation is lost or reset.
+    """
+    for tag in tags:
+        try:
+            cache.set(_tag_key(tag), uuid.uuid4().hex, timeout=0)
+            _count('invalidations')
+        except Exception:
+            _count('errors')
+
+
+def cached_resource(*tags, timeout=None, per_user=False):
+    """
+    Read-through cache for a Resource GET handler.
+
+    Tags are format strings filled in from the view arguments, e.g.
+    'questions:{quiz_id}'. Responses are keyed by path, query string, the
+    caller's role and the generation of every tag, and only successful (200)
+    responses are stored. Apply it below the auth decorators so that access
+    checks still run on every request.
+
+    Views whose response depends on the caller must pass per_user=True: the
+    user's ID is then part of the key and available to tags as '{user_id}'.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            role = 'admin' if current_user.has_role('admin') else 'user'
+            if per_user:
+                role = f'{role}:{current_user.id}'
+            try:
+                values = dict(kwargs, user_id=current_user.id) if per_user else kwargs
+                resolved = [tag.format(**values) for tag in tags]
+                generations = tag_generations(resolved)
+                key = 'view:{}:{}:{}'.format(
+                    role, request.full_path, ','.join(f'{t}={g}' for t, g in zip(resolved, generations))
+                )
+                cached = cache.get(key)
+            except Exception:
+                # A broken cache backend must never take the API down with it
+                _count('errors')
+                return view(*args, **kwargs)
+
+            if cached is not None:
+                _count('hits')
+                response = make_response(cached)
+                response.mimetype = 'application/json'
+                return response
+
+            _count('misses')
+            response = view(*args, **kwargs)
+            if getattr(response, 'status_code', None) == 200:
+                try:
+                    cache.set(key, response.get_data(), timeout=timeout)
+                except Exception:
+                    _count('errors')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,82 @@
+import hashlib
+import threading
+
+from flask import json
+
+from cache import current_generation, invalidate_tags
+from models import db, Subject, Chapter, Quiz
+
+
+class CatalogSnapshot:
+    """A materialized subject -> chapter -> quiz tree stamped with the catalog generation."""
+
+    def __init__(self, version, tree):
+        self.version = version
+        self.body = json.dumps({'version': version, 'subjects': tree})
+        self.etag = hashlib.sha1(self.body.encode('utf-8')).hexdigest()
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def build_catalog_tree():
+    """Load the whole catalog with one projected query per level and nest it."""
+    subjects = db.session.query(Subject.id, Subject.name, Subject.description).order_by(Subject.id).all()
+    chapters = db.session.query(
+        Chapter.id, Chapter.subject_id, Chapter.name, Chapter.description
+    ).order_by(Chapter.id).all()
+    quizzes = db.session.query(
+        Quiz.id, Quiz.chapter_id, Quiz.date_of_quiz, Quiz.time_duration, Quiz.remarks
+    ).order_by(Quiz.id).all()
+
+    quizzes_by_chapter = {}
+    for quiz in quizzes:
+        quizzes_by_chapter.setdefault(quiz.chapter_id, []).append(quiz._asdict())
+
+    chapters_by_subject = {}
+    for chapter in chapters:
+        chapter_data = chapter._asdict()
+        chapter_data['quizzes'] = quizzes_by_chapter.get(chapter.id, [])
+        chapters_by_subject.setdefault(chapter.subject_id, []).append(chapter_data)
+
+    tree = []
+    for subject in subjects:
+        subject_data = subject._asdict()
+        subject_data['chapters'] = chapters_by_subject.get(subject.id, [])
+        tree.append(subject_data)
+    return tree
+
+
+def get_catalog():
+    """
+    Return the current catalog snapshot, rebuilding it only after an invalidation.
+
+    The snapshot is stamped with the shared 'catalog' tag generation, so a write
+    handled by any worker process invalidates the snapshot held by every other.
+    While the shared cache is unavailable the generation is unknown, so every
+    call builds a fresh snapshot and none is kept.
+    """
+    global _snapshot
+    generation = current_generation('catalog')
+    if generation is None:
+        return CatalogSnapshot(None, build_catalog_tree())
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == generation:
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot.version != generation:
+            snapshot = CatalogSnapshot(generation, build_catalog_tree())
+            # Only publish if no mutation happened while the tree was being built
+            if current_generation('catalog') == generation:
+                _snapshot = snapshot
+        return snapshot
+
+
+def invalidate_catalog():
+    """Drop the snapshot and bump the shared catalog generation after a subject/chapter/quiz write."""
+    global _snapshot
+    _snapshot = None
+    invalidate_tags('catalog')
@@ -1,4 +1,11 @@
-broker_url='redis://localhost:6379/1'
-result_backend='redis://localhost:6379/2'
+import os
+
+# Set CELERY_BROKER_URL=memory:// and CELERY_RESULT_BACKEND=cache+memory:// (optionally with
+# CELERY_TASK_ALWAYS_EAGER=1) to run tasks without Redis in tests and local runs
+broker_url=os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/1')
+result_backend=os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/2')
+task_always_eager=os.environ.get('CELERY_TASK_ALWAYS_EAGER') == '1'
+task_store_eager_result=True
+task_track_started=True
 broker_connection_retry_on_startup=True
-timezone='Asia/Kolkata'
\ No newline at end of file
+timezone='Asia/Kolkata'
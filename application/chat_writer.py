@@ -0,0 +1,170 @@
+import atexit
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from models import db, ChatMessage, User
+
+_STOP = object()
+
+
+class ChatWriter:
+    """
+    Write-behind persistence for chat messages.
+
+    Messages are queued in memory and inserted by a background thread in
+    batches of up to CHAT_WRITE_BATCH_SIZE rows, or whatever has arrived after
+    CHAT_WRITE_FLUSH_INTERVAL seconds, so the Socket.IO handlers never wait on
+    the database write lock. Pending messages are flushed on shutdown.
+
+    Messages are broadcast under a provisional ID. Once a batch is stored, a
+    'message_saved' event with the provisional and the persisted ID is emitted
+    to each message's room, so clients can resume history sync (since_id) from
+    real IDs.
+    """
+
+    def __init__(self, app=None, socketio=None):
+        self.app = None
+        self.socketio = None
+        self.batch_size = 100
+        self.flush_interval = 0.5
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio=None):
+        self.app = app
+        self.socketio = socketio
+        self.batch_size = app.config.get('CHAT_WRITE_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('CHAT_WRITE_FLUSH_INTERVAL', self.flush_interval)
+        app.extensions['chat_writer'] = self
+        atexit.register(self.stop)
+
+    def enqueue(self, sender_id, recipient_id, message, room=None):
+        """
+        Queue a message for persistence.
+
+        Args:
+          room: The chat room the message is broadcast to; its 'message_saved'
+            event goes to the same room.
+
+        Returns:
+          The row to be inserted, with a provisional ID the message can be
+          emitted under right away.
+        """
+        self._ensure_started()
+        row = {
+            'sender_id': sender_id,
+            'recipient_id': recipient_id,
+            'message': message,
+            'timestamp': datetime.utcnow(),
+        }
+        provisional_id = f'tmp-{uuid.uuid4().hex}'
+        self._queue.put((row, provisional_id, room))
+        return dict(row, id=provisional_id)
+
+    def stop(self):
+        """Flush every pending message and stop the background thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chat-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        stopping = False
+        while True:
+            batch, stopping = self._next_batch(stopping)
+            if batch:
+                self._flush(batch)
+            if stopping and self._queue.empty():
+                return
+
+    def _next_batch(self, stopping):
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            try:
+                if stopping:
+                    item = self._queue.get_nowait()
+                elif deadline is None:
+                    item = self._queue.get()  # Block until the first message of the batch
+                else:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stopping = True
+                continue
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch, stopping
+
+    def _flush(self, batch):
+        table = ChatMessage.__table__
+        insert = table.insert().returning(table.c.id, sort_by_parameter_order=True)
+        with self.app.app_context():
+            try:
+                ids = db.session.execute(insert, [row for row, _, _ in batch]).scalars().all()
+                db.session.commit()
+                self._announce(zip(batch, ids))
+                return
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error saving chat batch, retrying row by row: {e}")
+
+            # Isolate the rows that fail so one bad message does not lose the batch
+            saved = []
+            for item in batch:
+                try:
+                    saved.append((item, db.session.execute(insert, [item[0]]).scalar_one()))
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error saving message: {e}")
+            self._announce(saved)
+
+    def _announce(self, saved):
+        """Tell each message's room the persisted ID of its provisional one."""
+        if self.socketio is None:
+            return
+        for (_, provisional_id, room), message_id in saved:
+            if room is None:
+                continue
+            try:
+                self.socketio.emit('message_saved', {'provisional_id': provisional_id, 'id': message_id},
+                                   room=room, namespace='/chat')
+            except Exception as e:
+                print(f"Error announcing saved message: {e}")
+
+
+chat_writer = ChatWriter()
+
+_admin_id = None
+
+
+def admin_user_id():
+    """Return the ID of the admin account, looked up once and then cached."""
+    global _admin_id
+    if _admin_id is None:
+        admin = db.session.query(User.id).filter_by(email='admin@example.com').first()
+        if admin:
+            _admin_id = admin.id
+    return _admin_id
+
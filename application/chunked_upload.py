@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+from flask import current_app
+
+RECORDING_KINDS = ('video', 'audio')
+COPY_BUFFER_SIZE = 64 * 1024
+
+_upload_id_pattern = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(Exception):
+    """Raised when an upload session or chunk is invalid; carries the HTTP status to return."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _spool_root():
+    return os.path.join(current_app.root_path, current_app.config['RECORDINGS_SPOOL_DEST'])
+
+
+def session_dir(upload_id):
+    if not _upload_id_pattern.match(upload_id or ''):
+        raise UploadError('Upload not found', 404)
+    return os.path.join(_spool_root(), upload_id)
+
+
+def create_session(user_id, quiz_id, extensions):
+    """
+    Create a resumable recording upload session on disk.
+
+    Args:
+      extensions: Mapping of kind ('video', 'audio') to file extension, e.g. '.webm'.
+
+    Returns:
+      The upload ID.
+    """
+    upload_id = uuid.uuid4().hex
+    path = session_dir(upload_id)
+    os.makedirs(path)
+    with open(os.path.join(path, 'session.json'), 'w') as f:
+        json.dump({'user_id': user_id, 'quiz_id': quiz_id, 'extensions': extensions}, f)
+    return upload_id
+
+
+def load_session(upload_id, user_id, quiz_id):
+    """Return the metadata of an upload session owned by the user for the given quiz."""
+    try:
+        with open(os.path.join(session_dir(upload_id), 'session.json')) as f:
+            session = json.load(f)
+    except FileNotFoundError:
+        raise UploadError('Upload not found', 404)
+    if session['user_id'] != user_id or session['quiz_id'] != quiz_id:
+        raise UploadError('Upload not found', 404)
+    return session
+
+
+def _chunk_path(upload_id, kind, index):
+    if kind not in RECORDING_KINDS:
+        raise UploadError('Kind must be video or audio')
+    return os.path.join(session_dir(upload_id), f'{kind}.{index:06d}.chunk')
+
+
+def write_chunk(upload_id, kind, index, stream):
+    """
+    Stream one chunk from the request body to disk.
+
+    Chunks go to their own numbered files, so they may arrive out of order and
+    a retried chunk simply replaces the previous attempt.
+    """
+    path = _chunk_path(upload_id, kind, index)
+    partial_path = f'{path}.partial'
+    with open(partial_path, 'wb') as f:
+        shutil.copyfileobj(stream, f, COPY_BUFFER_SIZE)
+    os.replace(partial_path, path)
+
+
+def received_chunks(upload_id):
+    """Return the sorted chunk indexes received so far for each kind."""
+    received = {kind: [] for kind in RECORDING_KINDS}
+    for name in os.listdir(session_dir(upload_id)):
+        if name.endswith('.chunk'):
+            kind, index, _ = name.split('.')
+            received[kind].append(int(index))
+    return {kind: sorted(indexes) for kind, indexes in received.items()}
+
+
+def assemble(upload_id, session, manifest):
+    """
+    Concatenate every kind's chunks into its final file and verify its checksum.
+
+    Args:
+      manifest: Mapping of kind to {'chunks': count, 'sha256': hex digest}.
+
+    Returns:
+      Mapping of kind to the assembled file name inside the session folder.
+    """
+    path = session_dir(upload_id)
+    received = received_chunks(upload_id)
+    files = {}
+    for kind in RECORDING_KINDS:
+        expected = manifest.get(kind) or {}
+        try:
+            count = int(expected.get('chunks'))
+        except (TypeError, ValueError):
+            raise UploadError(f'Chunk count for {kind} is required')
+        missing = sorted(set(range(count)) - set(received[kind]))
+        if missing:
+            raise UploadError(f'Missing {kind} chunks: {missing}', 409)
+
+        filename = kind + session['extensions'].get(kind, '')
+        digest = hashlib.sha256()
+        with open(os.path.join(path, filename), 'wb') as out:
+            for index in range(count):
+                with open(_chunk_path(upload_id, kind, index), 'rb') as chunk:
+                    for block in iter(lambda: chunk.read(COPY_BUFFER_SIZE), b''):
+                        digest.update(block)
+                        out.write(block)
+        if digest.hexdigest() != str(expected.get('sha256', '')).lower():
+            os.remove(os.path.join(path, filename))
+            raise UploadError(f'Checksum mismatch for {kind}', 422)
+        files[kind] = filename
+
+    for name in os.listdir(path):
+        if name.endswith('.chunk'):
+            os.remove(os.path.join(path, name))
+    return files
+
+
+def expired_sessions(max_age):
+    """
+    Yield the folders of upload sessions with no activity for max_age seconds.
+
+    Activity is the newest modification time of the folder or any file in it,
+    so sessions still receiving chunks, or finalized and awaiting their upload
+    task, are kept.
+    """
+    root = _spool_root()
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - max_age
+    for upload_id in os.listdir(root):
+        path = os.path.join(root, upload_id)
+        if not _upload_id_pattern.match(upload_id) or not os.path.isdir(path):
+            continue
+        try:
+            newest = max([os.path.getmtime(path)] + [
+                os.path.getmtime(os.path.join(path, name)) for name in os.listdir(path)
+            ])
+        except FileNotFoundError:
+            continue  # Removed meanwhile, e.g. by its upload task
+        if newest < cutoff:
+            yield path
@@ -0,0 +1,101 @@
+import threading
+
+import numpy as np
+
+from cache import current_generation
+from models import db, Question
+
+# Packed layout of Score.responses: one (question ID, chosen option) pair per
+# question of the quiz, option 0 meaning unanswered
+RESPONSE_DTYPE = np.dtype([('question_id', '<i4'), ('option', 'i1')])
+OPTION_COUNT = 4
+
+
+class AnswerKey:
+    """The correct options of a quiz, aligned by question ID."""
+
+    def __init__(self, question_ids, correct_options, generation=None):
+        self.generation = generation
+        self.question_ids = question_ids
+        self.correct_options = np.asarray(correct_options, dtype=np.int8)
+        self.positions = {question_id: index for index, question_id in enumerate(question_ids)}
+
+    @property
+    def total_marks(self):
+        return len(self.question_ids)
+
+    def responses(self, answers):
+        """
+        Convert a raw answer map into a response array aligned with the key.
+
+        Unanswered or unknown questions, and options outside 1..OPTION_COUNT,
+        are left as 0, which never matches a correct option.
+        """
+        submitted = np.zeros(len(self.question_ids), dtype=np.int8)
+        for question_id, option in (answers or {}).items():
+            try:
+                position = self.positions.get(int(question_id))
+                if position is None or option is None:
+                    continue
+                option = int(option)
+            except (TypeError, ValueError, OverflowError):
+                continue
+            if 1 <= option <= OPTION_COUNT:
+                submitted[position] = option
+        return submitted
+
+    def pack(self, submitted):
+        """Pack a response array aligned with the key into Score.responses bytes."""
+        packed = np.empty(len(self.question_ids), dtype=RESPONSE_DTYPE)
+        packed['question_id'] = self.question_ids
+        packed['option'] = submitted
+        return packed.tobytes()
+
+
+_answer_keys = {}
+_answer_keys_lock = threading.Lock()
+
+
+def get_answer_key(quiz_id):
+    """
+    Return the cached answer key for a quiz, loading it with one query on a miss.
+
+    Keys are stamped with the shared 'questions:<quiz_id>' tag generation, so
+    question writes handled by another worker process also invalidate them.
+    While the shared cache is unavailable the generation is unknown, so every
+    call reloads the key rather than risk grading with a stale one.
+    """
+    generation = current_generation(f'questions:{quiz_id}')
+    key = _answer_keys.get(quiz_id)
+    if key is not None and generation is not None and key.generation == generation:
+        return key
+
+    rows = db.session.query(Question.id, Question.correct_option).filter(
+        Question.quiz_id == quiz_id
+    ).order_by(Question.id).all()
+    key = AnswerKey([row.id for row in rows], [row.correct_option or 0 for row in rows], generation)
+    with _answer_keys_lock:
+        _answer_keys[quiz_id] = key
+    return key
+
+
+def invalidate_answer_key(*quiz_ids):
+    """Drop the cached answer keys of the given quizzes after their questions change."""
+    with _answer_keys_lock:
+        for quiz_id in quiz_ids:
+            _answer_keys.pop(quiz_id, None)
+
+
+def grade_attempt(quiz_id, answers):
+    """
+    Grade a raw answer map and pack the responses for storage on the Score.
+
+    Every answer is compared with the key in one vectorized pass.
+
+    Returns:
+      A (total_scored, total_marks, packed responses) tuple.
+    """
+    key = get_answer_key(quiz_id)
+    submitted = key.responses(answers)
+    return int(np.count_nonzero(submitted == key.correct_options)), key.total_marks, key.pack(submitted)
+
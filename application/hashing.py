@@ -0,0 +1,64 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingOverloaded(Exception):
+    """Raised when the hashing queue is full, or a hash timed out, and the request should be shed."""
+
+
+class PasswordHasher:
+    """
+    Runs password hashing on a dedicated, size-bounded thread pool.
+
+    Only HASH_WORKERS hashes run at once, so a login burst cannot take every
+    core away from chat and score submission (the hashlib KDFs release the GIL
+    while they run). At most HASH_QUEUE_DEPTH requests may be waiting or running;
+    beyond that calls fail fast with HashingOverloaded. A call that waits longer
+    than HASH_TIMEOUT is shed the same way.
+    """
+
+    def __init__(self, app=None):
+        self.workers = max(1, (os.cpu_count() or 2) // 2)
+        self.queue_depth = 64
+        self.timeout = 30
+        self._executor = None
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.workers = app.config.get('HASH_WORKERS', self.workers)
+        self.queue_depth = app.config.get('HASH_QUEUE_DEPTH', self.queue_depth)
+        self.timeout = app.config.get('HASH_TIMEOUT', self.timeout)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(self.queue_depth)
+        app.extensions['password_hasher'] = self
+
+    def _run(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingOverloaded()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()  # Frees the slot now if the hash has not started yet
+            raise HashingOverloaded()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+
+password_hasher = PasswordHasher()
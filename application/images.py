@@ -0,0 +1,126 @@
+import hashlib
+import os
+import tempfile
+import time
+
+from flask import current_app
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+# Longest edge in pixels of each derivative served to candidates
+PHOTO_VARIANT_SIZES = {
+    'small': 320,
+    'medium': 800,
+    'large': 1600,
+}
+PHOTO_VARIANT_QUALITY = 80
+
+# Files in these folders are named after their content, so they never change
+CONTENT_ADDRESSED_FOLDERS = ('originals/', 'variants/')
+
+
+def images_root():
+    return os.path.join(current_app.root_path, current_app.config['UPLOADED_PHOTOS_DEST'])
+
+
+def original_name(content_hash, extension):
+    return f"originals/{content_hash[:2]}/{content_hash}{extension}"
+
+
+def variant_name(content_hash, size):
+    return f"variants/{content_hash[:2]}/{content_hash}-{size}.webp"
+
+
+def image_url(name):
+    return f"/uploads/images/{name}"
+
+
+def store_photo(file):
+    """
+    Save an uploaded image under a path derived from its SHA-256.
+
+    Identical uploads map to the same file, so they are stored only once. An
+    existing file is touched so that collect_unreferenced_images treats it as
+    a fresh upload until the new Photo row is committed.
+
+    Returns:
+      A (content_hash, photo_url) tuple.
+    """
+    extension = os.path.splitext(file.filename)[1].lower()
+    root = images_root()
+    os.makedirs(root, exist_ok=True)
+
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=root, delete=False) as tmp:
+        for block in iter(lambda: file.stream.read(COPY_BUFFER_SIZE), b''):
+            digest.update(block)
+            tmp.write(block)
+    content_hash = digest.hexdigest()
+
+    name = original_name(content_hash, extension)
+    path = os.path.join(root, name)
+    if os.path.exists(path):
+        os.remove(tmp.name)
+        os.utime(path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp.name, path)
+    return content_hash, image_url(name)
+
+
+def generate_variants(content_hash, photo_url):
+    """
+    Create the resized, recompressed WebP derivatives of a stored original.
+
+    Derivatives are content-addressed too, so an image shared by several
+    questions is only processed once.
+
+    Returns:
+      Mapping of size name to URL.
+    """
+    from PIL import Image, ImageOps
+
+    root = images_root()
+    source = os.path.join(root, photo_url[len(image_url('')):])
+    variants = {}
+    with Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+        for size, edge in PHOTO_VARIANT_SIZES.items():
+            name = variant_name(content_hash, size)
+            path = os.path.join(root, name)
+            if not os.path.exists(path):
+                image = original.copy()
+                image.thumbnail((edge, edge))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                partial_path = f'{path}.partial'
+                image.save(partial_path, 'WEBP', quality=PHOTO_VARIANT_QUALITY)
+                os.replace(partial_path, path)
+            variants[size] = image_url(name)
+    return variants
+
+
+def unreferenced_files(referenced_hashes, grace_seconds):
+    """
+    Yield stored originals and derivatives whose content hash no Photo references.
+
+    Files younger than grace_seconds are skipped so uploads whose Photo row is
+    not committed yet are never collected.
+    """
+    root = images_root()
+    cutoff = time.time() - grace_seconds
+    for folder in ('originals', 'variants'):
+        for dirpath, _, filenames in os.walk(os.path.join(root, folder)):
+            for filename in filenames:
+                content_hash = filename.split('.')[0].split('-')[0]
+                path = os.path.join(dirpath, filename)
+                if content_hash not in referenced_hashes and os.path.getmtime(path) < cutoff:
+                    yield path
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
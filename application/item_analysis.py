@@ -0,0 +1,133 @@
+import numpy as np
+
+from grading import OPTION_COUNT, RESPONSE_DTYPE, get_answer_key
+from models import db, Score
+
+RESPONSE_CHUNK = 5000
+
+# Thresholds of the review flags attached to each question
+TOO_EASY_DIFFICULTY = 0.95
+TOO_HARD_DIFFICULTY = 0.20
+LOW_DISCRIMINATION = 0.10
+
+
+def response_matrix(question_ids, blobs):
+    """
+    Unpack stored Score.responses into an attempts x questions matrix of chosen options.
+
+    Columns follow question_ids (sorted ascending, as in the answer key). Answers
+    to questions that no longer exist are dropped, and questions added after an
+    attempt read as unanswered (0).
+    """
+    question_ids = np.asarray(question_ids, dtype=np.int64)
+    matrix = np.zeros((len(blobs), len(question_ids)), dtype=np.int8)
+    if not len(blobs) or not len(question_ids):
+        return matrix
+    packed = np.frombuffer(b''.join(blobs), dtype=RESPONSE_DTYPE)
+    rows = np.repeat(np.arange(len(blobs)), [len(blob) // RESPONSE_DTYPE.itemsize for blob in blobs])
+    columns = np.searchsorted(question_ids, packed['question_id'])
+    columns = np.minimum(columns, len(question_ids) - 1)
+    known = question_ids[columns] == packed['question_id']
+    matrix[rows[known], columns[known]] = packed['option'][known]
+    return matrix
+
+
+def analyze_items(correct_options, matrix):
+    """
+    Compute classical item statistics for every question as matrix operations.
+
+    Args:
+      correct_options: Keyed option of each question (length q).
+      matrix: Chosen options, attempts x questions (0 = unanswered).
+
+    Returns:
+      A dict of arrays: 'difficulty' (proportion correct), 'discrimination'
+      (point-biserial correlation of each item with the rest of the test),
+      'choices' (q x OPTION_COUNT + 1 proportions, column 0 being unanswered) and
+      'choice_scores' (mean total score of the attempts choosing each option).
+    """
+    attempts, questions = matrix.shape
+    correct = (matrix == np.asarray(correct_options, dtype=np.int8)[None, :]).astype(np.float64)
+    difficulty = correct.mean(axis=0) if attempts else np.full(questions, np.nan)
+
+    # Correlate each item with the score on the other items, so it does not inflate itself
+    rest = correct.sum(axis=1, keepdims=True) - correct
+    item_centered = correct - difficulty
+    rest_centered = rest - rest.mean(axis=0) if attempts else rest
+    covariance = (item_centered * rest_centered).sum(axis=0)
+    spread = np.sqrt((item_centered ** 2).sum(axis=0) * (rest_centered ** 2).sum(axis=0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        discrimination = np.where(spread > 0, covariance / spread, np.nan)
+
+    total = correct.sum(axis=1)
+    counts = np.empty((questions, OPTION_COUNT + 1))
+    score_sums = np.empty((questions, OPTION_COUNT + 1))
+    for option in range(OPTION_COUNT + 1):
+        chose = matrix == option
+        counts[:, option] = np.count_nonzero(chose, axis=0)
+        score_sums[:, option] = total @ chose
+    with np.errstate(invalid='ignore', divide='ignore'):
+        choice_scores = np.where(counts > 0, score_sums / counts, np.nan)
+    return {
+        'difficulty': difficulty,
+        'discrimination': discrimination,
+        'choices': counts / max(attempts, 1),
+        'choice_scores': choice_scores,
+    }
+
+
+def _flags(difficulty, discrimination, choice_scores, correct_option):
+    flags = []
+    if difficulty >= TOO_EASY_DIFFICULTY:
+        flags.append('too_easy')
+    if difficulty <= TOO_HARD_DIFFICULTY:
+        flags.append('too_hard')
+    if not np.isnan(discrimination) and discrimination < LOW_DISCRIMINATION:
+        flags.append('low_discrimination')
+    # Negative discrimination with a distractor picked by stronger candidates than
+    # the key usually means the question is miskeyed
+    distractor_scores = choice_scores[1:]
+    if 1 <= correct_option <= OPTION_COUNT:
+        distractor_scores = np.delete(distractor_scores, correct_option - 1)
+    if (not np.isnan(discrimination) and discrimination < 0
+            and np.nanmax(distractor_scores, initial=-np.inf) > choice_scores[correct_option]):
+        flags.append('possibly_miskeyed')
+    return flags
+
+
+def quiz_item_analysis(quiz_id):
+    """
+    Run item analysis over every recorded attempt of a quiz.
+
+    Attempts are read as raw response blobs in RESPONSE_CHUNK batches; attempts
+    made before responses were stored are skipped.
+
+    Returns:
+      A dict with the number of analysed attempts and one entry per question.
+    """
+    key = get_answer_key(quiz_id)
+    query = db.session.query(Score.responses).filter(
+        Score.quiz_id == quiz_id, Score.responses.isnot(None)
+    ).execution_options(yield_per=RESPONSE_CHUNK)
+    blobs = [responses for responses, in query]
+    matrix = response_matrix(key.question_ids, blobs)
+    stats = analyze_items(key.correct_options, matrix)
+
+    items = []
+    for index, question_id in enumerate(key.question_ids):
+        difficulty = float(stats['difficulty'][index])
+        discrimination = float(stats['discrimination'][index])
+        choices = stats['choices'][index]
+        items.append({
+            'question_id': question_id,
+            'correct_option': int(key.correct_options[index]),
+            'difficulty': None if np.isnan(difficulty) else round(difficulty, 3),
+            'discrimination': None if np.isnan(discrimination) else round(discrimination, 3),
+            'choices': {
+                'unanswered': round(float(choices[0]), 3),
+                **{str(option): round(float(choices[option]), 3) for option in range(1, OPTION_COUNT + 1)},
+            },
+            'flags': _flags(difficulty, discrimination, stats['choice_scores'][index],
+                            int(key.correct_options[index])) if blobs else [],
+        })
+    return {'quiz_id': quiz_id, 'attempts': len(blobs), 'items': items}
@@ -1,3 +1,14 @@
+import os
+
+# Green-thread servers must patch the standard library before anything else
+# imports it, or sockets, locks and the message queue client block the hub
+if os.environ.get('SOCKETIO_ASYNC_MODE') == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif os.environ.get('SOCKETIO_ASYNC_MODE') == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
 from flask import Flask,send_from_directory
 from flask_login import LoginManager, login_required, current_user, UserMixin, login_user, logout_user 
 from flask_security import Security, SQLAlchemyUserDatastore
@@ -8,8 +19,9 @@ from flask_cors import CORS
 import flask_excel as excel
 from flask_sqlalchemy import SQLAlchemy
 from celery.schedules import crontab
-#from tasks import monthly_reminder, daily_remainder
-#from cache import cache
+from cache import cache
+from media import send_media
+from images import CONTENT_ADDRESSED_FOLDERS
 from resources import api
 from flask_uploads import UploadSet, configure_uploads, IMAGES, DOCUMENTS, patch_request_class
 import secrets
@@ -26,6 +38,10 @@ app = Flask(__name__)  # Create the Flask app instance first
 app.config['UPLOADED_PHOTOS_DEST'] = 'uploads/images' 
 app.config['UPLOADED_DOCUMENTS_DEST'] = 'uploads/documents'
 app.config['UPLOADED_VIDEOS_DEST'] = 'uploads/videos'
+app.config['EXPORTS_DEST'] = 'exports'
+app.config['RECORDINGS_SPOOL_DEST'] = 'uploads/recordings/spool'
+app.config['RECORDING_UPLOAD_TTL'] = 24 * 60 * 60  # Seconds before an inactive upload session is deleted
+app.config['RECORDING_STORAGE'] = os.environ.get('RECORDING_STORAGE', 'uploadcare')  # or 'local'
 
 photos = UploadSet('photos', IMAGES)
 documents = UploadSet('documents', extensions=('pdf', 'doc', 'docx'))
@@ -34,6 +50,28 @@ videos = UploadSet('videos', ['mp4', 'mov', 'avi'])
 configure_uploads(app, (photos, documents, videos))
 patch_request_class(app, 16 * 1024 * 1024) 
 
+def load_secret(name):
+    """
+    Read a secret from the environment, falling back to one persisted in the
+    instance folder so every worker process of a deployment shares it.
+    """
+    value = os.environ.get(name)
+    if value:
+        return value
+
+    path = os.path.join(app.instance_path, name.lower())
+    os.makedirs(app.instance_path, exist_ok=True)
+    try:
+        # O_EXCL makes concurrent worker start-ups agree on a single value
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path) as f:
+            return f.read().strip()
+    with os.fdopen(fd, 'w') as f:
+        f.write(secrets.token_hex(32))
+    with open(path) as f:
+        return f.read().strip()
+
 def create_app():
     login_manager = LoginManager(app)
     login_manager.login_view = 'login'  # Specify the login view
@@ -42,18 +80,40 @@ def create_app():
     def load_user(user_id):
         return User.query.get(int(user_id))
 
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///appdb.sqlite3'
-    app.config['SECRET_KEY'] = secrets.token_hex(16)
-    app.config['SECURITY_PASSWORD_SALT'] = 'thisnameispriyansh'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///appdb.sqlite3')
+    # Secrets must be identical across worker processes or tokens issued by one are rejected by another
+    app.config['SECRET_KEY'] = load_secret('SECRET_KEY')
+    app.config['SECURITY_PASSWORD_SALT'] = os.environ.get('SECURITY_PASSWORD_SALT', 'thisnameispriyansh')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['WTF_CSR_ENABLED'] = False
     app.config['SECURITY_TOKEN_AUTHENTICATION_HEADER'] = 'Authentication-Token'
-    app.config['CACHE_TYPE'] = 'RedisCache'
-    app.config['CACHE_REDIS_HOST'] = 'localhost'
-    app.config['CACHE_REDIS_PORT'] = 6379
+    # Set CACHE_TYPE=SimpleCache to use an in-process cache instead of Redis (tests, local runs)
+    app.config['CACHE_TYPE'] = os.environ.get('CACHE_TYPE', 'RedisCache')
+    app.config['CACHE_REDIS_HOST'] = os.environ.get('CACHE_REDIS_HOST', 'localhost')
+    app.config['CACHE_REDIS_PORT'] = int(os.environ.get('CACHE_REDIS_PORT', 6379))
     app.config['CACHE_REDIS_DB'] = 3
     app.config['CACHE_DEFAULT_TIMEOUT'] = 300
-    #cache.init_app(app)
+    # Set SOCKETIO_MESSAGE_QUEUE (e.g. redis://localhost:6379/4) to run more than one process
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    app.config['SOCKETIO_ASYNC_MODE'] = os.environ.get('SOCKETIO_ASYNC_MODE')  # threading, eventlet or gevent
+    # MEDIA_DELIVERY=x-accel (nginx) or x-sendfile (Apache/lighttpd) hands /uploads files to the front proxy
+    app.config['MEDIA_DELIVERY'] = os.environ.get('MEDIA_DELIVERY', 'app')
+    app.config['MEDIA_ACCEL_PREFIX'] = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-uploads')
+    app.config['MEDIA_CACHE_MAX_AGE'] = 365 * 24 * 60 * 60
+    app.config['USE_X_SENDFILE'] = app.config['MEDIA_DELIVERY'] == 'x-sendfile'
+    # REMINDER_NOTIFIER=smtp sends reminders as e-mails; 'file' appends them to REMINDER_OUTBOX
+    app.config['REMINDER_NOTIFIER'] = os.environ.get('REMINDER_NOTIFIER', 'file')
+    app.config['REMINDER_OUTBOX'] = 'outbox/reminders.jsonl'
+    app.config['REMINDER_CHUNK_SIZE'] = 1000
+    app.config['REMINDER_INACTIVE_DAYS'] = 7
+    app.config['SMTP_HOST'] = os.environ.get('SMTP_HOST', 'localhost')
+    app.config['SMTP_PORT'] = int(os.environ.get('SMTP_PORT', 25))
+    app.config['SMTP_USERNAME'] = os.environ.get('SMTP_USERNAME')
+    app.config['SMTP_PASSWORD'] = os.environ.get('SMTP_PASSWORD')
+    app.config['SMTP_SENDER'] = os.environ.get('SMTP_SENDER', 'noreply@quizmaster.local')
+    app.config['ACTIVITY_FLUSH_INTERVAL'] = 60  # Seconds between bulk last_activity updates
+    app.config['ACTIVE_NOW_WINDOW'] = 5 * 60  # Users seen within this many seconds count as active now
+    cache.init_app(app)
 
 
     CORS(app)
@@ -65,20 +125,38 @@ def create_app():
     
     @app.route('/uploads/images/<path:filename>')
     def uploaded_image(filename):
-        return send_from_directory(app.config['UPLOADED_PHOTOS_DEST'], filename)
+        return send_media(app.config['UPLOADED_PHOTOS_DEST'], filename, 'images',
+                          immutable_prefixes=CONTENT_ADDRESSED_FOLDERS)
 
     @app.route('/uploads/documents/<path:filename>')
     def uploaded_document(filename):
-        return send_from_directory(app.config['UPLOADED_DOCUMENTS_DEST'], filename)
+        return send_media(app.config['UPLOADED_DOCUMENTS_DEST'], filename, 'documents')
 
     @app.route('/uploads/videos/<path:filename>')
     def uploaded_video(filename):
-        return send_from_directory(app.config['UPLOADED_VIDEOS_DEST'], filename)
+        return send_media(app.config['UPLOADED_VIDEOS_DEST'], filename, 'videos')
     api.init_app(app)
     excel.init_excel(app)
     app.security = Security(app, datastore)
-    socketio = SocketIO(app, cors_allowed_origins="*")  # Initialize SocketIO
+    from auth_cache import auth_cache
+
+    auth_cache.init_app(app)
+    from hashing import password_hasher
+
+    password_hasher.init_app(app)
+    from activity import activity_tracker
+
+    activity_tracker.init_app(app)
+    socketio = SocketIO(
+        app,
+        cors_allowed_origins="*",
+        message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'],
+        async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+    )  # Initialize SocketIO
     from resources import ChatNamespace  
+    from chat_writer import chat_writer
+
+    chat_writer.init_app(app, socketio)
 
     socketio.on_namespace(ChatNamespace('/chat')) 
 
@@ -88,21 +166,40 @@ def create_app():
 
 app,socketio=create_app()
 celery_app = celery_init_app(app)
-
-
-'''
-@celery_app.on_after_configure.connect
-def celery_job(sender,**kwargs):
-    #sender.add_periodic_task(crontab(hour=12, minute=21, day_of_month=5), monthly_reminder.s())
-    #sender.add_periodic_task(crontab(hour=12, minute=21), daily_remainder.s())
-
-    #for testing
-    #sender.add_periodic_task(60,monthly_reminder.s())
-    #sender.add_periodic_task(40,daily_remainder.s())
-'''
+import tasks  # Register the Celery tasks
+
+# Run with: celery -A main.celery_app beat
+celery_app.conf.beat_schedule = {
+    'daily-reminder': {
+        'task': 'tasks.daily_reminder',
+        'schedule': crontab(hour=18, minute=0),
+    },
+    'monthly-reminder': {
+        'task': 'tasks.monthly_reminder',
+        'schedule': crontab(hour=9, minute=0, day_of_month=1),
+    },
+    'collect-unreferenced-images': {
+        'task': 'tasks.collect_unreferenced_images',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'collect-expired-uploads': {
+        'task': 'tasks.collect_expired_uploads',
+        'schedule': crontab(minute=30),
+    },
+    # Runs more often than tasks.ANOMALY_LOOKBACK so no closing quiz window is missed
+    'score-finished-quizzes': {
+        'task': 'tasks.score_finished_quizzes',
+        'schedule': crontab(minute='*/15'),
+    },
+}
 
 
 # ... (rest of your code) ...
 if __name__ == '__main__':
     initialize_sample_data()
-    socketio.run(app, debug=True)  # Run the app with SocketIO
+    socketio.run(
+        app,
+        host=os.environ.get('HOST', '127.0.0.1'),
+        port=int(os.environ.get('PORT', 5000)),
+        debug=os.environ.get('FLASK_DEBUG', '1') == '1',
+    )  # Run the app with SocketIO
@@ -0,0 +1,77 @@
+import hashlib
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import abort, current_app, make_response, request, send_from_directory
+from werkzeug.security import safe_join
+
+MEDIA_DELIVERY_MODES = ('app', 'x-accel', 'x-sendfile')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age={max_age}, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+
+def _media_path(directory, filename):
+    path = safe_join(os.path.join(current_app.root_path, directory), filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    return path
+
+
+def fingerprint(path):
+    """Short version tag of a file; it changes whenever the file is replaced."""
+    stat = os.stat(path)
+    return hashlib.sha1(f'{stat.st_mtime_ns}-{stat.st_size}'.encode()).hexdigest()[:12]
+
+
+def media_url(url_prefix, directory, filename):
+    """
+    Build the fingerprinted URL of a stored file, e.g. /uploads/videos/x.webm?v=1a2b3c4d5e6f.
+
+    Responses to a URL carrying the current fingerprint are cached as immutable.
+    """
+    path = os.path.join(current_app.root_path, directory, filename)
+    return f"{url_prefix}/{quote(filename)}?v={fingerprint(path)}"
+
+
+def send_media(directory, filename, location, immutable_prefixes=()):
+    """
+    Serve an uploaded file with long-lived caching where its URL is fingerprinted.
+
+    Files under immutable_prefixes (content-addressed names) or requested with the
+    current ?v= fingerprint are sent with Cache-Control: immutable; anything else
+    must be revalidated, which is cheap through ETag/Last-Modified.
+
+    MEDIA_DELIVERY selects who copies the bytes:
+      'app': Flask streams the file, answering Range and conditional requests.
+      'x-accel': An X-Accel-Redirect to MEDIA_ACCEL_PREFIX/<location>/<filename> is
+        returned for nginx to serve from an internal location.
+      'x-sendfile': An X-Sendfile header is returned for Apache/lighttpd
+        (USE_X_SENDFILE is enabled by create_app).
+
+    Args:
+      directory: Upload folder, relative to the application root.
+      filename: Path of the file inside the folder.
+      location: Name of the folder in proxy paths ('images', 'documents', 'videos').
+      immutable_prefixes: Filename prefixes whose content never changes.
+
+    Returns:
+      The Flask response.
+    """
+    path = _media_path(directory, filename)
+    immutable = filename.startswith(tuple(immutable_prefixes)) or request.args.get('v') == fingerprint(path)
+    max_age = current_app.config['MEDIA_CACHE_MAX_AGE']
+
+    if current_app.config['MEDIA_DELIVERY'] == 'x-accel':
+        response = make_response('')
+        response.headers['X-Accel-Redirect'] = f"{current_app.config['MEDIA_ACCEL_PREFIX']}/{location}/{quote(filename)}"
+        response.headers['Content-Type'] = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    else:
+        response = send_from_directory(directory, filename, conditional=True, max_age=max_age if immutable else 0)
+
+    if immutable:
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL.format(max_age=max_age)
+    else:
+        response.headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+    return response
@@ -0,0 +1,141 @@
+from sqlalchemy import Index, inspect, text
+from models import db, Chapter, Quiz, Question, Photo, Score, ChatMessage, ReminderLog, QuizStats, roles_users
+
+
+def _create_indexes(connection, *indexes):
+    for index in indexes:
+        index.create(bind=connection, checkfirst=True)
+
+
+def add_foreign_key_indexes(connection):
+    """Index the foreign keys used by every hot lookup in resources.py."""
+    _create_indexes(
+        connection,
+        Index('ix_chapter_subject_id', Chapter.__table__.c.subject_id),
+        Index('ix_quiz_chapter_id', Quiz.__table__.c.chapter_id),
+        Index('ix_question_quiz_id', Question.__table__.c.quiz_id),
+        Index('ix_photo_question_id', Photo.__table__.c.question_id),
+        Index('ix_score_user_id_quiz_id', Score.__table__.c.user_id, Score.__table__.c.quiz_id),
+        Index('ix_score_quiz_id_user_id', Score.__table__.c.quiz_id, Score.__table__.c.user_id),
+        Index('ix_chat_message_sender_id_timestamp',
+              ChatMessage.__table__.c.sender_id, ChatMessage.__table__.c.timestamp),
+        Index('ix_chat_message_recipient_id_timestamp',
+              ChatMessage.__table__.c.recipient_id, ChatMessage.__table__.c.timestamp),
+    )
+
+
+
+def add_chat_participant_indexes(connection):
+    """Index chat messages by participant and ID for cursor-paginated history."""
+    _create_indexes(
+        connection,
+        Index('ix_chat_message_sender_id_id', ChatMessage.__table__.c.sender_id, ChatMessage.__table__.c.id),
+        Index('ix_chat_message_recipient_id_id', ChatMessage.__table__.c.recipient_id, ChatMessage.__table__.c.id),
+    )
+
+
+
+def _add_columns(connection, table, *columns):
+    existing = {column['name'] for column in inspect(connection).get_columns(table.name)}
+    for column in columns:
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+
+def add_photo_content_addressing(connection):
+    """Add the content hash and derivative variants of question photos."""
+    _add_columns(connection, Photo.__table__, Photo.__table__.c.content_hash, Photo.__table__.c.variants)
+    _create_indexes(connection, Index('ix_photo_content_hash', Photo.__table__.c.content_hash))
+
+
+
+def add_reminder_log(connection):
+    """Create the table that keeps reminder jobs idempotent per period and index role lookups by user."""
+    ReminderLog.__table__.create(bind=connection, checkfirst=True)
+    _create_indexes(
+        connection,
+        Index('ix_roles_users_user_id_role_id', roles_users.c.user_id, roles_users.c.role_id),
+    )
+
+
+
+def add_quiz_stats(connection):
+    """Create the per-quiz aggregates table and fill it from the existing scores."""
+    from quiz_stats import rebuild_quiz_stats
+    QuizStats.__table__.create(bind=connection, checkfirst=True)
+    rebuild_quiz_stats(connection)
+
+
+
+def add_score_responses(connection):
+    """Add the packed per-question answers of each attempt."""
+    _add_columns(connection, Score.__table__, Score.__table__.c.responses)
+
+
+
+def add_score_anomalies(connection):
+    """Add anomaly scoring results; flags set before it existed count as manual."""
+    table = Score.__table__
+    _add_columns(connection, table, table.c.flag_source, table.c.anomaly_score, table.c.anomaly_reasons)
+    connection.execute(table.update().where(table.c.flagged.is_(True)).values(flag_source='manual'))
+
+
+
+def add_quiz_rankings(connection):
+    """Add every participant's best attempt to the quiz statistics and rebuild them."""
+    from quiz_stats import rebuild_quiz_stats
+    table = QuizStats.__table__
+    _add_columns(connection, table, table.c.best_attempts, table.c.ranking)
+    rebuild_quiz_stats(connection)
+
+
+# Ordered (version, description, upgrade) entries. Append new migrations at the end
+# and never edit one that has already shipped.
+MIGRATIONS = [
+    (1, 'Add foreign key indexes', add_foreign_key_indexes),
+    (2, 'Add chat participant indexes', add_chat_participant_indexes),
+    (3, 'Add photo content hashes and variants', add_photo_content_addressing),
+    (4, 'Add reminder log', add_reminder_log),
+    (5, 'Add quiz statistics', add_quiz_stats),
+    (6, 'Add score responses', add_score_responses),
+    (7, 'Add score anomaly scoring', add_score_anomalies),
+    (8, 'Add quiz rankings', add_quiz_rankings),
+]
+
+
+def current_version(connection):
+    connection.execute(text('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+    return connection.execute(text('SELECT MAX(version) FROM schema_version')).scalar() or 0
+
+
+def run_migrations():
+    """
+    Apply every pending migration to the current database, each in its own transaction.
+
+    Must be called inside an app context, after db.create_all() has created any
+    missing tables.
+
+    Returns:
+      The list of versions that were applied.
+    """
+    applied = []
+    with db.engine.begin() as connection:
+        version = current_version(connection)
+    for migration_version, description, upgrade in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        with db.engine.begin() as connection:
+            upgrade(connection)
+            connection.execute(text('INSERT INTO schema_version (version) VALUES (:version)'),
+                               {'version': migration_version})
+        print(f"Applied migration {migration_version}: {description}")
+        applied.append(migration_version)
+    return applied
+
+
+if __name__ == '__main__':
+    from main import app
+    with app.app_context():
+        db.create_all()
+        run_migrations()
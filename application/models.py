@@ -7,7 +7,8 @@ db = SQLAlchemy()
 roles_users = db.Table(
     'roles_users',
     db.Column('user_id', db.Integer(), db.ForeignKey('user.id')),
-    db.Column('role_id', db.Integer(), db.ForeignKey('role.id'))
+    db.Column('role_id', db.Integer(), db.ForeignKey('role.id')),
+    db.Index('ix_roles_users_user_id_role_id', 'user_id', 'role_id'),
 )
 
 class Role(db.Model, RoleMixin):
@@ -59,7 +60,7 @@ class Subject(db.Model):
 
 class Chapter(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'))
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), index=True)
     name = db.Column(db.String(255))
     description = db.Column(db.String(255))
     subject = db.relationship("Subject", backref=db.backref("chapters", lazy="dynamic"))
@@ -77,7 +78,7 @@ class Chapter(db.Model):
 
 class Quiz(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    chapter_id = db.Column(db.Integer, db.ForeignKey('chapter.id'))
+    chapter_id = db.Column(db.Integer, db.ForeignKey('chapter.id'), index=True)
     date_of_quiz = db.Column(db.DateTime())
     time_duration = db.Column(db.String(5))  # HH:MM format
     remarks = db.Column(db.String(255))
@@ -97,7 +98,7 @@ class Quiz(db.Model):
 
 class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'))
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), index=True)
     question_statement = db.Column(db.Text)
     option1 = db.Column(db.String(255))
     option2 = db.Column(db.String(255))
@@ -123,6 +124,10 @@ class Question(db.Model):
 
 
 class Score(db.Model):
+    __table_args__ = (
+        db.Index('ix_score_user_id_quiz_id', 'user_id', 'quiz_id'),
+        db.Index('ix_score_quiz_id_user_id', 'quiz_id', 'user_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -135,6 +140,10 @@ class Score(db.Model):
     duration_quiz = db.Column(db.Integer)  # Add duration_quiz (in seconds)
     recording_url = db.Column(db.String(255))
     flagged = db.Column(db.Boolean, default=False)
+    flag_source = db.Column(db.String(10))  # 'auto' (anomaly scorer) or 'manual' (admin override)
+    anomaly_score = db.Column(db.Float)  # Largest robust z-score of the attempt within its quiz
+    anomaly_reasons = db.Column(db.JSON)  # [{'reason': ..., 'z': ...}] above the flag threshold
+    responses = db.deferred(db.Column(db.LargeBinary))  # Packed answers, see grading.RESPONSE_DTYPE
     quiz = db.relationship("Quiz", backref=db.backref("scores", lazy="dynamic"))
     user = db.relationship("User", backref=db.backref("scores", lazy="dynamic"))
 
@@ -156,13 +165,18 @@ class Score(db.Model):
             'duration_quiz': self.duration_quiz,
             'recording_url': self.recording_url,
             'flagged': self.flagged,
+            'flag_source': self.flag_source,
+            'anomaly_score': self.anomaly_score,
+            'anomaly_reasons': self.anomaly_reasons,
         }
 
 
 class Photo(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    question_id = db.Column(db.Integer, db.ForeignKey('question.id'))
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), index=True)
     photo_url = db.Column(db.String(255))  # Store the URL of the photo
+    content_hash = db.Column(db.String(64), index=True)  # SHA-256 of the original file
+    variants = db.Column(db.JSON)  # {size name: URL} of the resized derivatives
 
     def __str__(self):
         return f"Photo {self.id} - Question: {self.question_id}"
@@ -172,11 +186,19 @@ class Photo(db.Model):
             'id': self.id,
             'question_id': self.question_id,
             'photo_url': self.photo_url,
+            'content_hash': self.content_hash,
+            'variants': self.variants,
         }
 
 
 
 class ChatMessage(db.Model):
+    __table_args__ = (
+        db.Index('ix_chat_message_sender_id_timestamp', 'sender_id', 'timestamp'),
+        db.Index('ix_chat_message_recipient_id_timestamp', 'recipient_id', 'timestamp'),
+        db.Index('ix_chat_message_sender_id_id', 'sender_id', 'id'),
+        db.Index('ix_chat_message_recipient_id_id', 'recipient_id', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     recipient_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -196,4 +218,33 @@ class ChatMessage(db.Model):
             'recipient_id': self.recipient_id,
             'message': self.message,
             'timestamp': self.timestamp,
-        }
\ No newline at end of file
+        }
+
+class ReminderLog(db.Model):
+    """One row per reminder sent, so each job reaches a user at most once per period."""
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'period', 'user_id', name='uq_reminder_log_kind_period_user_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'daily' or 'monthly'
+    period = db.Column(db.String(10), nullable=False)  # YYYY-MM-DD or YYYY-MM
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    sent_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class QuizStats(db.Model):
+    """Running score aggregates of a quiz, updated with every new Score (see quiz_stats.py)."""
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), primary_key=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    score_sum = db.Column(db.Integer, default=0, nullable=False)
+    score_sq_sum = db.Column(db.Integer, default=0, nullable=False)
+    score_min = db.Column(db.Integer)
+    score_max = db.Column(db.Integer)
+    time_sum = db.Column(db.Integer, default=0, nullable=False)  # Seconds, over attempts that reported a time
+    time_count = db.Column(db.Integer, default=0, nullable=False)
+    histogram = db.Column(db.JSON)  # Attempts per 10% band of total_scored / total_marks
+    score_counts = db.Column(db.JSON)  # {total_scored: attempts}, for exact ranks and percentiles
+    leaderboard = db.Column(db.JSON)  # Best attempt of the top users, best first
+    best_attempts = db.Column(db.JSON)  # {user_id: ranking key of the user's best attempt}
+    ranking = db.Column(db.JSON)  # Ranking keys of every participant's best attempt, sorted, for bisecting
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,51 @@
+import json
+import os
+import smtplib
+from email.message import EmailMessage
+
+from flask import current_app
+
+
+class FileNotifier:
+    """Appends each message as a JSON line to REMINDER_OUTBOX (local runs and tests)."""
+
+    def send(self, messages):
+        path = os.path.join(current_app.root_path, current_app.config['REMINDER_OUTBOX'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as f:
+            for message in messages:
+                f.write(json.dumps(message) + '\n')
+
+
+class SmtpNotifier:
+    """Sends messages as e-mails over a single SMTP connection per batch."""
+
+    def send(self, messages):
+        config = current_app.config
+        with smtplib.SMTP(config['SMTP_HOST'], config['SMTP_PORT']) as smtp:
+            if config.get('SMTP_USERNAME'):
+                smtp.starttls()
+                smtp.login(config['SMTP_USERNAME'], config['SMTP_PASSWORD'])
+            for message in messages:
+                email = EmailMessage()
+                email['From'] = config['SMTP_SENDER']
+                email['To'] = message['to']
+                email['Subject'] = message['subject']
+                email.set_content(message['body'])
+                smtp.send_message(email)
+
+
+NOTIFIER_BACKENDS = {
+    'file': FileNotifier,
+    'smtp': SmtpNotifier,
+}
+
+_notifiers = {}
+
+
+def reminder_notifier():
+    """Return the notifier selected by REMINDER_NOTIFIER ('file' or 'smtp')."""
+    name = current_app.config.get('REMINDER_NOTIFIER', 'file')
+    if name not in _notifiers:
+        _notifiers[name] = NOTIFIER_BACKENDS[name]()
+    return _notifiers[name]
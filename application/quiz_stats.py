@@ -0,0 +1,307 @@
+from bisect import bisect_left, insort
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, QuizStats, Score
+
+HISTOGRAM_BUCKETS = 10  # 10% bands; a full score falls in the last one
+LEADERBOARD_SIZE = 10
+REPORTED_PERCENTILES = (25, 50, 75, 90)
+UNTIMED = 10 ** 12  # Sorts attempts without a time after every timed one in stored ranking keys
+
+
+def _bucket(total_scored, total_marks):
+    # Out-of-range scores (e.g. negative legacy values) land in the first or last band
+    return max(0, min(HISTOGRAM_BUCKETS - 1, total_scored * HISTOGRAM_BUCKETS // total_marks))
+
+
+def _leaderboard_key(entry):
+    # Higher score first, then the faster attempt, then the earlier one
+    time_took = entry['time_took_to_attempt_test']
+    return (-entry['total_scored'], time_took if time_took is not None else float('inf'), entry['score_id'])
+
+
+def _ranking_key(total_scored, time_took, score_id):
+    # The leaderboard key in a JSON-friendly form: [-score, seconds or UNTIMED, score ID]
+    return [-total_scored, UNTIMED if time_took is None else time_took, score_id]
+
+
+def _leaderboard_entry(score_id, user_id, total_scored, total_marks, time_took):
+    return {
+        'score_id': score_id,
+        'user_id': user_id,
+        'total_scored': total_scored,
+        'total_marks': total_marks,
+        'time_took_to_attempt_test': time_took,
+    }
+
+
+def _empty_stats(quiz_id):
+    return QuizStats(
+        quiz_id=quiz_id, attempts=0, score_sum=0, score_sq_sum=0, time_sum=0, time_count=0,
+        histogram=[0] * HISTOGRAM_BUCKETS, score_counts={}, leaderboard=[], best_attempts={}, ranking=[],
+    )
+
+
+def _locked_stats(quiz_id):
+    stats = db.session.query(QuizStats).filter_by(quiz_id=quiz_id).with_for_update().first()
+    if stats is not None:
+        return stats
+    try:
+        # Savepoint, so a concurrent first attempt only costs a re-read
+        with db.session.begin_nested():
+            stats = _empty_stats(quiz_id)
+            db.session.add(stats)
+        return stats
+    except IntegrityError:
+        return db.session.query(QuizStats).filter_by(quiz_id=quiz_id).with_for_update().one()
+
+
+def record_score(score):
+    """
+    Fold a new Score into its quiz's aggregates and leaderboard.
+
+    Must be called after the score is flushed and before the commit, so the
+    aggregates are committed (or rolled back) together with the score. The
+    stats row is locked for the update on databases that support it.
+    """
+    if score.total_scored is None:
+        return
+    stats = _locked_stats(score.quiz_id)
+    total_scored = int(score.total_scored)
+
+    stats.attempts += 1
+    stats.score_sum += total_scored
+    stats.score_sq_sum += total_scored * total_scored
+    stats.score_min = total_scored if stats.score_min is None else min(stats.score_min, total_scored)
+    stats.score_max = total_scored if stats.score_max is None else max(stats.score_max, total_scored)
+    if score.time_took_to_attempt_test is not None:
+        stats.time_sum += int(score.time_took_to_attempt_test)
+        stats.time_count += 1
+
+    # JSON columns only notice reassignment, so every update builds new values
+    if score.total_marks:
+        histogram = list(stats.histogram or [0] * HISTOGRAM_BUCKETS)
+        histogram[_bucket(total_scored, score.total_marks)] += 1
+        stats.histogram = histogram
+    score_counts = dict(stats.score_counts or {})
+    score_counts[str(total_scored)] = score_counts.get(str(total_scored), 0) + 1
+    stats.score_counts = score_counts
+
+    entry = _leaderboard_entry(score.id, score.user_id, total_scored, score.total_marks,
+                               score.time_took_to_attempt_test)
+    leaderboard = list(stats.leaderboard or [])
+    previous = next((item for item in leaderboard if item['user_id'] == score.user_id), None)
+    if previous is None or _leaderboard_key(entry) < _leaderboard_key(previous):
+        if previous is not None:
+            leaderboard.remove(previous)
+        leaderboard.append(entry)
+        leaderboard.sort(key=_leaderboard_key)
+        stats.leaderboard = leaderboard[:LEADERBOARD_SIZE]
+
+    # Every participant's best attempt, kept sorted for bisecting in user_standing
+    time_took = score.time_took_to_attempt_test
+    key = _ranking_key(total_scored, None if time_took is None else int(time_took), score.id)
+    best_attempts = dict(stats.best_attempts or {})
+    previous_key = best_attempts.get(str(score.user_id))
+    if previous_key is None or key < previous_key:
+        ranking = list(stats.ranking or [])
+        if previous_key is not None:
+            ranking.pop(bisect_left(ranking, previous_key))
+        insort(ranking, key)
+        best_attempts[str(score.user_id)] = key
+        stats.best_attempts = best_attempts
+        stats.ranking = ranking
+
+
+class ScoreDistribution:
+    """
+    Exact score distribution of a quiz, built from QuizStats.score_counts.
+
+    Percentiles binary-search the cumulative counts of the distinct scores, so
+    they cost O(log k) for k distinct scores (at most total_marks + 1), however
+    many attempts there are.
+    """
+
+    def __init__(self, score_counts):
+        scores = sorted((int(score), count) for score, count in (score_counts or {}).items())
+        self.scores = np.array([score for score, _ in scores], dtype=np.int64)
+        self.cumulative = np.cumsum([count for _, count in scores], dtype=np.int64)
+        self.total = int(self.cumulative[-1]) if len(self.cumulative) else 0
+
+    def percentile(self, percent):
+        """Nearest-rank percentile of the attempt scores."""
+        if not self.total:
+            return None
+        target = max(1, int(np.ceil(percent * self.total / 100)))
+        return int(self.scores[np.searchsorted(self.cumulative, target, side='left')])
+
+
+def user_standing(stats, user_id):
+    """
+    A user's best attempt of a quiz and its rank among every participant's best attempt.
+
+    Best attempts are ordered with the leaderboard's key (higher score, then
+    faster, then earlier), so the rank is the position the user has, or would
+    have, on the leaderboard. The rank is a bisect over QuizStats.ranking.
+
+    Returns:
+      A dict with 'best_score', 'rank', 'participants' and 'percentile' (the
+      share of other participants ranked below), or None without an attempt.
+    """
+    key = (stats.best_attempts or {}).get(str(user_id))
+    if key is None:
+        return None
+    ranking = stats.ranking or []
+    rank = bisect_left(ranking, key) + 1
+    participants = len(ranking)
+    return {
+        'best_score': -key[0],
+        'rank': rank,
+        'participants': participants,
+        'percentile': round((participants - rank) * 100 / participants, 1),
+    }
+
+
+def stats_payload(stats):
+    """Serialize a QuizStats row with its derived mean, spread and percentiles."""
+    attempts = stats.attempts
+    mean = stats.score_sum / attempts if attempts else None
+    variance = max(0.0, stats.score_sq_sum / attempts - mean * mean) if attempts else None
+    distribution = ScoreDistribution(stats.score_counts)
+    return {
+        'quiz_id': stats.quiz_id,
+        'attempts': attempts,
+        'mean_score': round(mean, 2) if mean is not None else None,
+        'stddev_score': round(variance ** 0.5, 2) if variance is not None else None,
+        'min_score': stats.score_min,
+        'max_score': stats.score_max,
+        'average_time_took_to_attempt_test': round(stats.time_sum / stats.time_count, 1) if stats.time_count else None,
+        'histogram': stats.histogram or [0] * HISTOGRAM_BUCKETS,
+        'percentiles': {str(percent): distribution.percentile(percent) for percent in REPORTED_PERCENTILES},
+        'updated_at': stats.updated_at,
+    }
+
+
+def _group_starts(keys):
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+
+def compute_quiz_stats(quiz_ids, user_ids, score_ids, scored, marks, times):
+    """
+    Compute every quiz's aggregates from parallel score arrays in one vectorized pass.
+
+    marks and times are float arrays with NaN where the value is missing.
+
+    Returns:
+      A list of QuizStats column dictionaries, one per quiz with attempts.
+    """
+    if not len(quiz_ids):
+        return []
+    quizzes, inverse = np.unique(quiz_ids, return_inverse=True)
+    count = len(quizzes)
+
+    attempts = np.bincount(inverse, minlength=count)
+    score_sum = np.bincount(inverse, weights=scored, minlength=count)
+    score_sq_sum = np.bincount(inverse, weights=scored.astype(np.float64) ** 2, minlength=count)
+    by_quiz = np.argsort(inverse, kind='stable')
+    starts = _group_starts(inverse[by_quiz])
+    score_min = np.minimum.reduceat(scored[by_quiz], starts)
+    score_max = np.maximum.reduceat(scored[by_quiz], starts)
+
+    timed = ~np.isnan(times)
+    time_sum = np.bincount(inverse[timed], weights=times[timed], minlength=count)
+    time_count = np.bincount(inverse[timed], minlength=count)
+
+    marked = ~np.isnan(marks) & (marks > 0)
+    buckets = np.clip(scored[marked] * HISTOGRAM_BUCKETS // marks[marked].astype(np.int64),
+                      0, HISTOGRAM_BUCKETS - 1)
+    histograms = np.bincount(inverse[marked] * HISTOGRAM_BUCKETS + buckets.astype(np.int64),
+                             minlength=count * HISTOGRAM_BUCKETS).reshape(count, HISTOGRAM_BUCKETS)
+
+    pairs, pair_counts = np.unique(np.stack([inverse, scored]), axis=1, return_counts=True)
+    score_counts = [{} for _ in range(count)]
+    for quiz_index, score, attempts_at_score in zip(pairs[0], pairs[1], pair_counts):
+        score_counts[quiz_index][str(int(score))] = int(attempts_at_score)
+
+    # Best attempt per user (higher score, faster, earlier), then the top of each quiz
+    sort_times = np.where(np.isnan(times), np.inf, times)
+    order = np.lexsort((score_ids, sort_times, -scored, inverse))
+    _, first = np.unique(np.stack([inverse[order], user_ids[order]]), axis=1, return_index=True)
+    best = order[np.sort(first)]
+    best_starts = _group_starts(inverse[best])
+    position = np.arange(len(best)) - np.repeat(best_starts, np.diff(np.r_[best_starts, len(best)]))
+    best_attempts = [{} for _ in range(count)]
+    rankings = [[] for _ in range(count)]
+    for row in best:
+        key = _ranking_key(int(scored[row]), None if np.isnan(times[row]) else int(times[row]), int(score_ids[row]))
+        best_attempts[inverse[row]][str(int(user_ids[row]))] = key
+        rankings[inverse[row]].append(key)
+    leaderboards = [[] for _ in range(count)]
+    for row in best[position < LEADERBOARD_SIZE]:
+        leaderboards[inverse[row]].append(_leaderboard_entry(
+            int(score_ids[row]), int(user_ids[row]), int(scored[row]),
+            None if np.isnan(marks[row]) else int(marks[row]),
+            None if np.isnan(times[row]) else int(times[row]),
+        ))
+
+    now = datetime.utcnow()
+    return [{
+        'quiz_id': int(quizzes[index]),
+        'attempts': int(attempts[index]),
+        'score_sum': int(score_sum[index]),
+        'score_sq_sum': int(score_sq_sum[index]),
+        'score_min': int(score_min[index]),
+        'score_max': int(score_max[index]),
+        'time_sum': int(time_sum[index]),
+        'time_count': int(time_count[index]),
+        'histogram': histograms[index].tolist(),
+        'score_counts': score_counts[index],
+        'leaderboard': leaderboards[index],
+        'best_attempts': best_attempts[index],
+        'ranking': rankings[index],
+        'updated_at': now,
+    } for index in range(count)]
+
+
+def _float_column(values):
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def rebuild_quiz_stats(connection=None):
+    """
+    Recompute every QuizStats row from the Score table.
+
+    Args:
+      connection: Optional connection to run on (used by the migration that adds
+        the table); defaults to the session's connection, committed by the caller.
+
+    Returns:
+      The number of quizzes with statistics.
+    """
+    connection = connection or db.session.connection()
+    rows = connection.execute(select(
+        Score.quiz_id, Score.user_id, Score.id, Score.total_scored, Score.total_marks,
+        Score.time_took_to_attempt_test,
+    ).where(Score.total_scored.isnot(None), Score.quiz_id.isnot(None), Score.user_id.isnot(None))).all()
+    columns = list(zip(*rows)) or [()] * 6
+    stats = compute_quiz_stats(
+        np.array(columns[0], dtype=np.int64), np.array(columns[1], dtype=np.int64),
+        np.array(columns[2], dtype=np.int64), np.array(columns[3], dtype=np.int64),
+        _float_column(columns[4]), _float_column(columns[5]),
+    )
+    connection.execute(QuizStats.__table__.delete())
+    if stats:
+        connection.execute(QuizStats.__table__.insert(), stats)
+    return len(stats)
+
+
+if __name__ == '__main__':
+    from main import app
+    with app.app_context():
+        rebuilt = rebuild_quiz_stats()
+        db.session.commit()
+        print(f"Rebuilt statistics for {rebuilt} quizzes")
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, distinct, exists, func, or_
+
+from models import db, User, Role, Quiz, Score, ReminderLog, roles_users
+from notifiers import reminder_notifier
+
+
+def _candidates(*columns, kind, period):
+    """Active users with the 'user' role who have not been sent this reminder in this period."""
+    already_sent = exists().where(
+        ReminderLog.user_id == User.id, ReminderLog.kind == kind, ReminderLog.period == period
+    )
+    return db.session.query(User.id, User.email, User.full_name, *columns).join(
+        roles_users, roles_users.c.user_id == User.id
+    ).join(
+        Role, Role.id == roles_users.c.role_id
+    ).filter(
+        Role.name == 'user', User.active.is_(True), ~already_sent
+    )
+
+
+def daily_recipients(period, now=None):
+    """
+    Users who have been inactive for REMINDER_INACTIVE_DAYS or still have unattempted quizzes.
+
+    Returns:
+      A query of (id, email, full_name, last_activity, pending) rows, one per user.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=current_app.config['REMINDER_INACTIVE_DAYS'])
+    quiz_total = db.session.query(func.count(Quiz.id)).scalar_subquery()
+    pending = (quiz_total - func.count(distinct(Score.quiz_id))).label('pending')
+    return _candidates(
+        User.last_activity, pending, kind='daily', period=period
+    ).outerjoin(
+        Score, Score.user_id == User.id
+    ).group_by(
+        User.id
+    ).having(
+        or_(User.last_activity.is_(None), User.last_activity < cutoff, pending > 0)
+    )
+
+
+def monthly_recipients(period):
+    """
+    Every user with their attempt totals for the month, e.g. period '2024-05'.
+
+    Returns:
+      A query of (id, email, full_name, attempts, scored, marks) rows, one per user.
+    """
+    start = datetime.strptime(period, '%Y-%m')
+    end = (start + timedelta(days=32)).replace(day=1)
+    return _candidates(
+        func.count(Score.id).label('attempts'),
+        func.coalesce(func.sum(Score.total_scored), 0).label('scored'),
+        func.coalesce(func.sum(Score.total_marks), 0).label('marks'),
+        kind='monthly', period=period,
+    ).outerjoin(
+        Score, and_(Score.user_id == User.id, Score.time_stamp_of_attempt >= start,
+                    Score.time_stamp_of_attempt < end)
+    ).group_by(
+        User.id
+    )
+
+
+def daily_message(row):
+    lines = [f"Hi {row.full_name or row.email},", '']
+    if row.pending > 0:
+        lines.append(f"You have {row.pending} quiz(zes) you have not attempted yet.")
+    lines.append('Log in to Quiz Master to keep practising.')
+    return {'to': row.email, 'subject': 'Quiz Master reminder', 'body': '\n'.join(lines)}
+
+
+def monthly_message(row, period):
+    lines = [f"Hi {row.full_name or row.email},", '']
+    if row.attempts:
+        percentage = round(row.scored * 100 / row.marks, 1) if row.marks else 0
+        lines.append(f"In {period} you attempted {row.attempts} quiz(zes) and scored {percentage}% overall.")
+    else:
+        lines.append(f"You did not attempt any quizzes in {period}.")
+    return {'to': row.email, 'subject': f'Your Quiz Master activity for {period}', 'body': '\n'.join(lines)}
+
+
+def send_reminders(kind, period, recipients, compose):
+    """
+    Notify recipients in REMINDER_CHUNK_SIZE batches, recording each batch in ReminderLog.
+
+    Batches are read by keyset on User.id, so only one batch of plain rows is in
+    memory at a time. A batch is logged and committed only once the notifier has
+    accepted it, and logged users are excluded by the recipient query, so a rerun
+    for the same period resumes where a failed run stopped.
+
+    Args:
+      kind: Reminder kind stored in ReminderLog ('daily' or 'monthly').
+      period: Period key stored in ReminderLog.
+      recipients: Query of rows with at least an 'id' column.
+      compose: Callable turning a row into a {'to', 'subject', 'body'} message.
+
+    Returns:
+      The number of users notified.
+    """
+    notifier = reminder_notifier()
+    chunk_size = current_app.config['REMINDER_CHUNK_SIZE']
+    sent = 0
+    last_id = 0
+    while True:
+        rows = recipients.filter(User.id > last_id).order_by(User.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        sent_at = datetime.utcnow()
+        db.session.execute(ReminderLog.__table__.insert(), [
+            {'kind': kind, 'period': period, 'user_id': row.id, 'sent_at': sent_at} for row in rows
+        ])
+        try:
+            notifier.send([compose(row) for row in rows])
+        except Exception:
+            db.session.rollback()
+            raise
+        db.session.commit()
+        sent += len(rows)
+    return sent
@@ -14,6 +14,18 @@ from werkzeug.utils import secure_filename
 from pyuploadcare import Uploadcare
 import os
 from flask_socketio import Namespace, emit, join_room, leave_room
+from grading import grade_attempt, invalidate_answer_key
+from anomalies import parse_duration
+from item_analysis import quiz_item_analysis
+from catalog import get_catalog, invalidate_catalog
+from cache import cached_resource, cache_stats, invalidate_tags
+from chat_writer import chat_writer, admin_user_id
+from hashing import password_hasher, HashingOverloaded
+from activity import activity_tracker, active_user_count
+from quiz_stats import record_score, stats_payload, user_standing
+from images import store_photo
+from chunked_upload import (RECORDING_KINDS, UploadError, create_session, load_session, session_dir,
+                            write_chunk, received_chunks, assemble)
 
 
 
@@ -40,6 +52,33 @@ uploadcare = Uploadcare(public_key=UPLOADCARE_PUBLIC_KEY, secret_key=UPLOADCARE_
 
 
 
+_default_roles = {}
+
+
+def default_role(name):
+    """
+    Return the Role with the given name without querying it on every call.
+
+    The role is loaded once, kept detached, and merged into the current session
+    without a SELECT.
+    """
+    role = _default_roles.get(name)
+    if role is None:
+        role = Role.query.filter_by(name=name).first()
+        if role is None:
+            return None
+        db.session.expunge(role)
+        _default_roles[name] = role
+    return db.session.merge(role, load=False)
+
+
+def overloaded_response():
+    """503 response used to shed requests while the password hashing queue is full."""
+    response = make_response(jsonify({'message': 'Server is busy, please retry shortly'}), 503)
+    response.headers['Retry-After'] = '1'
+    return response
+
+
 class UserRegistration(Resource):
     def post(self):
         """
@@ -60,19 +99,25 @@ class UserRegistration(Resource):
             return make_response(jsonify({'message': 'User with this email already exists'}), 409)  # Use make_response
 
         try:
+            # End the read transaction so no pooled connection is held while the password hashes
+            db.session.commit()
             # Use user_datastore.create_user to create the user
             datastore.create_user(
                 email=email,
-                password=generate_password_hash(password),
+                password=password_hasher.hash(password),
                 full_name=full_name,
                 qualification=qualification,
                 dob=datetime.strptime(dob, '%Y-%m-%d').date(),
                 active=True,
-                roles=[Role.query.filter_by(name='user').first()]
+                roles=[default_role('user')]
             )
             db.session.commit()
             return make_response(jsonify({'message': 'User registered successfully'}), 201)
 
+        except HashingOverloaded:
+            db.session.rollback()
+            return overloaded_response()
+
         except Exception as e:
             db.session.rollback()
             return make_response(jsonify({'message': 'Failed to register user', 'error': str(e)}), 500)
@@ -91,14 +136,22 @@ class UserLogin(Resource):
             return make_response(jsonify({'message': 'Email and password are required'}), 400)
 
         user = datastore.find_user(email=email)
-        if not user or not check_password_hash(user.password, password):  # Use check_password_hash
-            return make_response(jsonify({'message': 'Invalid credentials'}), 401)
+        password_hash = user.password if user else None
+        # End the read transaction so a login burst waiting on the hashing pool
+        # does not hold every pooled connection; the user is reloaded afterwards
+        db.session.commit()
+        try:
+            if not user or not password_hasher.verify(password_hash, password):  # Hashed off the request thread
+                return make_response(jsonify({'message': 'Invalid credentials'}), 401)
+        except HashingOverloaded:
+            return overloaded_response()
 
         # Get user's roles
         roles = [role.name for role in user.roles]
 
         # Generate a token using Flask-Security
         token = user.get_auth_token()
+        activity_tracker.touch(user.id)
         
         return make_response(jsonify({
             'message': 'Login successful',
@@ -115,6 +168,7 @@ class UserLogin(Resource):
 class SubjectResource(Resource):
     @auth_required('token')
     @roles_required('admin')
+    @cached_resource('subjects')
     def get(self, subject_id=None):
         """Get subject(s) (Admin only).
         
@@ -149,6 +203,8 @@ class SubjectResource(Resource):
         try:
             db.session.add(new_subject)
             db.session.commit()
+            invalidate_catalog()
+            invalidate_tags('subjects')
             return make_response(jsonify({'message': 'Subject created', 'subject': new_subject.to_dict()}), 201)
         except Exception as e:
             db.session.rollback()
@@ -167,6 +223,8 @@ class SubjectResource(Resource):
         subject.description = data.get('description', subject.description)
         try:
             db.session.commit()
+            invalidate_catalog()
+            invalidate_tags('subjects')
             return make_response(jsonify({'message': 'Subject updated', 'subject': subject.to_dict()}), 200)
         except Exception as e:
             db.session.rollback()
@@ -183,6 +241,8 @@ class SubjectResource(Resource):
         try:
             db.session.delete(subject)
             db.session.commit()
+            invalidate_catalog()
+            invalidate_tags('subjects')
             return make_response(jsonify({'message': 'Subject deleted'}), 200)
         except Exception as e:
             db.session.rollback()
@@ -193,6 +253,7 @@ class SubjectResource(Resource):
 class ChapterResource(Resource):
     @auth_required('token')
     @roles_required('admin')
+    @cached_resource('chapters:{subject_id}')
     def get(self, subject_id, chapter_id=None):
         """
         Get chapter(s) for a subject (Admin only).
@@ -232,6 +293,8 @@ class ChapterResource(Resource):
         try:
             db.session.add(new_chapter)
             db.session.commit()
+            invalidate_catalog()
+            invalidate_tags(f'chapters:{subject_id}')
             return make_response(jsonify({'message': 'Chapter created', 'chapter': new_chapter.to_dict()}), 201)
         except Exception as e:
             db.session.rollback()
@@ -246,12 +309,15 @@ class ChapterResource(Resource):
         Update an existing chapter (Admin only).
         """
         chapter = Chapter.query.get_or_404(chapter_id)
+        previous_subject_id = chapter.subject_id
         data = request.get_json()
         chapter.subject_id = data.get('subject_id', chapter.subject_id)
         chapter.name = data.get('name', chapter.name)
         chapter.description = data.get('description', chapter.description)
         try:
             db.session.commit()
+            invalidate_catalog()
+            invalidate_tags(f'chapters:{previous_subject_id}', f'chapters:{chapter.subject_id}')
             return make_response(jsonify({'message': 'Chapter updated', 'chapter': chapter.to_dict()}), 200)
         except Exception as e:
             db.session.rollback()
@@ -267,6 +333,8 @@ class ChapterResource(Resource):
         try:
             db.session.delete(chapter)
             db.session.commit()
+            invalidate_catalog()
+            invalidate_tags(f'chapters:{chapter.subject_id}')
             return make_response(jsonify({'message': 'Chapter deleted'}), 200)
         except Exception as e:
             db.session.rollback()
@@ -277,6 +345,7 @@ class ChapterResource(Resource):
 class QuizResource(Resource):
     @auth_required('token')
     @roles_required('admin')
+    @cached_resource('quizzes:{chapter_id}')
     def get(self, subject_id, chapter_id, quiz_id=None):  # Add quiz_id as an optional argument
         """
         Get quizzes for a chapter (Admin only).
@@ -331,6 +400,8 @@ class QuizResource(Resource):
         try:
             db.session.add(new_quiz)
             db.session.commit()
+            invalidate_catalog()
+            invalidate_tags(f'quizzes:{chapter_id}')
             return make_response(jsonify({'message': 'Quiz created', 'quiz': new_quiz.to_dict()}), 201)
         except Exception as e:
             db.session.rollback()
@@ -366,6 +437,8 @@ class QuizResource(Resource):
         quiz.remarks = remarks
         try:
             db.session.commit()
+            invalidate_catalog()
+            invalidate_tags(f'quizzes:{quiz.chapter_id}')
             return make_response(jsonify({'message': 'Quiz updated', 'quiz': quiz.to_dict()}), 200)
         except Exception as e:
             db.session.rollback()
@@ -379,8 +452,11 @@ class QuizResource(Resource):
         """
         quiz = Quiz.query.get_or_404(quiz_id)
         try:
+            QuizStats.query.filter_by(quiz_id=quiz_id).delete()
             db.session.delete(quiz)
             db.session.commit()
+            invalidate_catalog()
+            invalidate_tags(f'quizzes:{quiz.chapter_id}')
             return make_response(jsonify({'message': 'Quiz deleted'}), 200)
         except Exception as e:
             db.session.rollback()
@@ -391,30 +467,72 @@ class QuizResource(Resource):
 
 
 
+def queue_photo_variants(*photo_ids):
+    """Queue derivative generation for new photos; the original is served until it finishes."""
+    from tasks import generate_photo_variants
+    for photo_id in photo_ids:
+        try:
+            generate_photo_variants.delay(photo_id)
+        except Exception as e:
+            print(f"Error queuing photo variants: {e}")
+
+
+def quiz_questions_payload(quiz_id, question_id=None, include_answers=True, photo_size=None):
+    """
+    Build the question payload for a quiz in a single query.
+
+    Questions are outer-joined with their photos so the whole quiz is loaded
+    in one round trip instead of one Photo lookup per question.
+
+    Args:
+      quiz_id: The ID of the quiz whose questions are returned.
+      question_id: Optional ID to restrict the payload to a single question.
+      include_answers: Whether to include 'correct_option' (False for candidates).
+      photo_size: Optional variant ('small', 'medium', 'large') to serve as 'photo_url'
+        when it has been generated; the original is used otherwise.
+
+    Returns:
+      A list of question dictionaries, each with 'photo_url' (and 'photo_variants'
+      once generated) when a photo exists.
+    """
+    query = db.session.query(Question, Photo.photo_url, Photo.variants).outerjoin(
+        Photo, Photo.question_id == Question.id
+    ).filter(Question.quiz_id == quiz_id)
+    if question_id:
+        query = query.filter(Question.id == question_id)
+
+    questions_data = {}
+    for question, photo_url, variants in query.order_by(Question.id, Photo.id):
+        if question.id in questions_data:
+            continue  # Keep the first photo, as the per-question lookup did
+        question_data = question.to_dict()
+        if not include_answers:
+            question_data.pop('correct_option')
+        if photo_url:
+            question_data['photo_url'] = (variants or {}).get(photo_size, photo_url)
+            if variants:
+                question_data['photo_variants'] = variants
+        questions_data[question.id] = question_data
+    return list(questions_data.values())
+
+
 class QuestionResource(Resource):
     @auth_required('token')
+    @roles_required('admin')
+    @cached_resource('questions:{quiz_id}')
     def get(self, subject_id, chapter_id, quiz_id, question_id=None):  
         """
         Get a question by ID or all questions for a quiz.
         """
         try:
+            photo_size = request.args.get('photo_size')
             if question_id:
-                question = Question.query.filter_by(id=question_id, quiz_id=quiz_id).first_or_404()
-                photo = Photo.query.filter_by(question_id=question_id).first()  # Get associated photo
-                question_data = question.to_dict()
-                if photo:
-                    question_data['photo_url'] = photo.photo_url  # Add photo_url to question data
-                return make_response(jsonify(question_data), 200)
+                questions_data = quiz_questions_payload(quiz_id, question_id, photo_size=photo_size)
+                if not questions_data:
+                    return make_response(jsonify({'message': 'Question not found'}), 404)
+                return make_response(jsonify(questions_data[0]), 200)
             else:
-                questions = Question.query.filter_by(quiz_id=quiz_id).all()
-                questions_data = []
-                for question in questions:
-                    question_data = question.to_dict()
-                    photo = Photo.query.filter_by(question_id=question.id).first()  # Get associated photo
-                    if photo:
-                        question_data['photo_url'] = photo.photo_url  # Add photo_url to question data
-                    questions_data.append(question_data)
-                return make_response(jsonify(questions_data), 200)
+                return make_response(jsonify(quiz_questions_payload(quiz_id, photo_size=photo_size)), 200)
         except Exception as e:
             return make_response(jsonify({'message': 'Failed to retrieve questions', 'error': str(e)}), 500)
 
@@ -465,15 +583,17 @@ class QuestionResource(Resource):
             db.session.add(new_question)
             db.session.commit()
 
-            # Save the image using photos.save(...)
+            # Save the image under its content hash
             if file and allowed_file(file.filename):
-                filename = photos.save(file)
-                photo_url = f"/uploads/images/{filename}"  # Construct the image URL
+                content_hash, photo_url = store_photo(file)
 
-                new_photo = Photo(question_id=new_question.id, photo_url=photo_url)
+                new_photo = Photo(question_id=new_question.id, photo_url=photo_url, content_hash=content_hash)
                 db.session.add(new_photo)
                 db.session.commit()
+                queue_photo_variants(new_photo.id)
 
+            invalidate_answer_key(new_question.quiz_id)
+            invalidate_tags(f'questions:{new_question.quiz_id}')
             return make_response(jsonify({'message': 'Question created', 'question': new_question.to_dict()}), 201)
         except Exception as e:
             db.session.rollback()
@@ -487,19 +607,23 @@ class QuestionResource(Resource):
         Update an existing question and optional image (Admin only).
         """
         question = Question.query.get_or_404(question_id)
+        previous_quiz_id = question.quiz_id
+        photo = None
 
         if 'file' in request.files:
             file = request.files['file']
             if file and allowed_file(file.filename):
-                filename = photos.save(file)  # Use photos.save(...)
-                photo_url = f"/uploads/images/{filename}"  # Construct the image URL
+                # The replaced file is left to collect_unreferenced_images
+                content_hash, photo_url = store_photo(file)
 
                 photo = Photo.query.filter_by(question_id=question.id).first()
                 if photo:
                     photo.photo_url = photo_url
+                    photo.content_hash = content_hash
+                    photo.variants = None
                 else:
-                    new_photo = Photo(question_id=question.id, photo_url=photo_url)
-                    db.session.add(new_photo)
+                    photo = Photo(question_id=question.id, photo_url=photo_url, content_hash=content_hash)
+                    db.session.add(photo)
 
         data = request.form  # Get data from form data
         question.quiz_id = data.get('quiz_id', question.quiz_id)
@@ -517,6 +641,10 @@ class QuestionResource(Resource):
 
         try:
             db.session.commit()
+            invalidate_answer_key(previous_quiz_id, question.quiz_id)
+            if photo is not None:
+                queue_photo_variants(photo.id)
+            invalidate_tags(f'questions:{previous_quiz_id}', f'questions:{question.quiz_id}')
             return make_response(jsonify({'message': 'Question updated', 'question': question.to_dict()}), 200)
         except Exception as e:
             db.session.rollback()
@@ -538,6 +666,8 @@ class QuestionResource(Resource):
 
             db.session.delete(question)
             db.session.commit()
+            invalidate_answer_key(question.quiz_id)
+            invalidate_tags(f'questions:{question.quiz_id}')
             return make_response(jsonify({'message': 'Question deleted'}), 200)
         except Exception as e:
             db.session.rollback()
@@ -548,45 +678,166 @@ class QuestionResource(Resource):
 
 
 
+QUESTION_IMPORT_BATCH_SIZE = 500
+
+
+class QuestionImportResource(Resource):
+    @auth_required('token')
+    @roles_required('admin')
+    def post(self, subject_id, chapter_id, quiz_id):
+        import zipfile
+        from werkzeug.datastructures import FileStorage
+        """
+        Bulk-import questions from a CSV/XLSX spreadsheet (Admin only).
+
+        The 'file' spreadsheet needs the columns question_statement, option1-4
+        and correct_option, plus an optional 'photo' column naming an image in
+        the optional 'images' zip archive. Rows are streamed and inserted in
+        batched transactions; invalid rows are skipped and reported.
+        """
+        if 'file' not in request.files:
+            return make_response(jsonify({'message': 'No file part'}), 400)
+
+        quiz = Quiz.query.get(quiz_id)
+        if not quiz:
+            return make_response(jsonify({'message': 'Quiz not found'}), 404)
+
+        archive = None
+        if 'images' in request.files and request.files['images'].filename:
+            try:
+                archive = zipfile.ZipFile(request.files['images'].stream)
+            except zipfile.BadZipFile:
+                return make_response(jsonify({'message': 'Images must be a zip archive'}), 400)
+
+        imported = 0
+        errors = []
+        batch = []  # (row number, question, photo name)
+        photo_ids = []
+
+        def flush_batch():
+            nonlocal imported
+            try:
+                db.session.add_all([question for _, question, _ in batch])
+                db.session.flush()
+                new_photos = []
+                for row_number, question, photo_name in batch:
+                    if photo_name:
+                        content_hash, photo_url = store_photo(FileStorage(
+                            stream=archive.open(photo_name), filename=os.path.basename(photo_name)
+                        ))
+                        new_photos.append(Photo(question_id=question.id, photo_url=photo_url, content_hash=content_hash))
+                db.session.add_all(new_photos)
+                db.session.commit()
+                imported += len(batch)
+                photo_ids.extend(photo.id for photo in new_photos)
+            except Exception as e:
+                db.session.rollback()
+                errors.extend({'row': row_number, 'error': str(e)} for row_number, _, _ in batch)
+            batch.clear()
+
+        try:
+            for row_number, row in enumerate(request.iget_records(field_name='file'), start=2):
+                question_statement = str(row.get('question_statement') or '').strip()
+                photo_name = str(row.get('photo') or '').strip()
+                try:
+                    correct_option = int(row.get('correct_option'))
+                except (TypeError, ValueError):
+                    correct_option = None
+
+                if not question_statement:
+                    errors.append({'row': row_number, 'error': 'Question statement is required'})
+                    continue
+                if correct_option is None or not 1 <= correct_option <= 4:
+                    errors.append({'row': row_number, 'error': 'Invalid correct option. It should be an integer between 1 and 4'})
+                    continue
+                if photo_name:
+                    if not allowed_file(photo_name):
+                        errors.append({'row': row_number, 'error': f'Photo type not allowed: {photo_name}'})
+                        continue
+                    if archive is None or photo_name not in archive.NameToInfo:
+                        errors.append({'row': row_number, 'error': f'Photo not found in images archive: {photo_name}'})
+                        continue
+
+                batch.append((row_number, Question(
+                    quiz_id=quiz_id,
+                    question_statement=question_statement,
+                    option1=row.get('option1'),
+                    option2=row.get('option2'),
+                    option3=row.get('option3'),
+                    option4=row.get('option4'),
+                    correct_option=correct_option,
+                ), photo_name))
+                if len(batch) >= QUESTION_IMPORT_BATCH_SIZE:
+                    flush_batch()
+            if batch:
+                flush_batch()
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({'message': 'Failed to read spreadsheet', 'error': str(e), 'imported': imported}), 400)
+        finally:
+            request.free_resources()
+            if archive is not None:
+                archive.close()
+            if imported:
+                invalidate_answer_key(quiz_id)
+                invalidate_tags(f'questions:{quiz_id}')
+                queue_photo_variants(*photo_ids)
+
+        return make_response(jsonify({'message': 'Questions imported', 'imported': imported, 'errors': errors}), 200)
+
+
+
 class ScoreResource(Resource):
     @auth_required('token')
     @roles_required('user')
     def post(self):
         """
         Create a new score record when a user attempts a quiz.
+
+        The raw answer map ({question_id: option}) is graded on the server;
+        client-supplied totals are ignored.
         """
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         quiz_id = data.get('quiz_id')
-        total_scored = data.get('total_scored')
+        answers = data.get('answers')
         remarks = data.get('remarks')
 
-        if not quiz_id or not total_scored:
-            return jsonify({'message': 'Quiz ID and total score are required'}), 400
+        if not quiz_id or answers is None:
+            return make_response(jsonify({'message': 'Quiz ID and answers are required'}), 400)
+        if not isinstance(answers, dict):
+            return make_response(jsonify({'message': 'Answers must be a mapping of question ID to option'}), 400)
 
         quiz = Quiz.query.get(quiz_id)
         if not quiz:
-            return jsonify({'message': 'Quiz not found'}), 404
+            return make_response(jsonify({'message': 'Quiz not found'}), 404)
 
-        new_score = Score(
-            quiz_id=quiz_id,
-            user_id=current_user.id,  # Get the user ID from the current user
-            time_stamp_of_attempt=datetime.utcnow(),  # Record the current time
-            total_scored=total_scored,
-            remarks=remarks
-        )
         try:
+            total_scored, total_marks, responses = grade_attempt(quiz.id, answers)
+            new_score = Score(
+                quiz_id=quiz.id,
+                user_id=current_user.id,  # Get the user ID from the current user
+                time_stamp_of_attempt=datetime.utcnow(),  # Record the current time
+                total_scored=total_scored,
+                total_marks=total_marks,
+                remarks=remarks,
+                responses=responses,
+            )
             db.session.add(new_score)
+            db.session.flush()
+            record_score(new_score)
             db.session.commit()
-            return jsonify({'message': 'Score recorded', 'score': new_score.to_dict()}), 201
+            invalidate_score_views([(new_score.quiz_id, new_score.user_id)])
+            return make_response(jsonify({'message': 'Score recorded', 'score': new_score.to_dict()}), 201)
         except Exception as e:
             db.session.rollback()
-            return jsonify({'message': 'Failed to record score', 'error': str(e)}), 500
+            return make_response(jsonify({'message': 'Failed to record score', 'error': str(e)}), 500)
         
 
 
 class UserSubjectResource(Resource):  
     @auth_required('token')
     @roles_required('user')  
+    @cached_resource('subjects')
     def get(self, subject_id=None):  # Add optional subject_id argument
         """
         Get all subjects or a specific subject by ID (authenticated user with 'user' role).
@@ -608,6 +859,7 @@ class UserSubjectResource(Resource):
 class UserChapterResource(Resource):
     @auth_required('token')
     @roles_required('user')
+    @cached_resource('chapters:{subject_id}')
     def get(self, subject_id, chapter_id=None):  # Add optional chapter_id argument
         """
         Get all chapters for a subject or a specific chapter by ID 
@@ -629,6 +881,7 @@ class UserChapterResource(Resource):
 class UserQuizResource(Resource):
     @auth_required('token')
     @roles_required('user')
+    @cached_resource('quizzes:{chapter_id}')
     def get(self, subject_id, chapter_id, quiz_id=None):  # Add optional quiz_id argument
         """
         Get all quizzes for a chapter or a specific quiz by ID (authenticated user with 'user' role).
@@ -645,52 +898,104 @@ class UserQuizResource(Resource):
         
 
 
+class UserCatalogResource(Resource):
+    @auth_required('token')
+    @roles_required('user')
+    def get(self):
+        """
+        Get the whole subject -> chapter -> quiz tree (authenticated user with 'user' role).
+
+        The tree is served from a version-stamped snapshot that is rebuilt only
+        after an admin changes a subject, chapter or quiz. Clients sending the
+        snapshot's ETag in If-None-Match receive a 304.
+        """
+        try:
+            snapshot = get_catalog()
+            if request.if_none_match.contains(snapshot.etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(snapshot.body, 200)
+                response.mimetype = 'application/json'
+            response.set_etag(snapshot.etag)
+            return response
+        except Exception as e:
+            return make_response(jsonify({'message': 'Failed to retrieve catalog', 'error': str(e)}), 500)
+
+
+
 class UserQuestionResource(Resource):
     @auth_required('token')
     @roles_required('user')
+    @cached_resource('questions:{quiz_id}')
     def get(self, subject_id, chapter_id, quiz_id, question_id=None):
         """
         Get a question by ID or all questions for a quiz (authenticated user with 'user' role).
         """
         try:
+            photo_size = request.args.get('photo_size')
             if question_id:
-                question = Question.query.filter_by(id=question_id, quiz_id=quiz_id).first_or_404()
-                photo = Photo.query.filter_by(question_id=question_id).first()
-                question_data = question.to_dict()
-                if photo:
-                    question_data['photo_url'] = photo.photo_url
-                return make_response(jsonify(question_data), 200)
+                questions_data = quiz_questions_payload(quiz_id, question_id, include_answers=False,
+                                                        photo_size=photo_size)
+                if not questions_data:
+                    return make_response(jsonify({'message': 'Question not found'}), 404)
+                return make_response(jsonify(questions_data[0]), 200)
             else:
-                questions = Question.query.filter_by(quiz_id=quiz_id).all()
-                questions_data = []
-                for question in questions:
-                    question_data = question.to_dict()
-                    photo = Photo.query.filter_by(question_id=question.id).first()
-                    if photo:
-                        question_data['photo_url'] = photo.photo_url
-                    questions_data.append(question_data)
+                questions_data = quiz_questions_payload(quiz_id, include_answers=False, photo_size=photo_size)
                 return make_response(jsonify(questions_data), 200)
         except Exception as e:
             return make_response(jsonify({'message': 'Failed to retrieve questions', 'error': str(e)}), 500)
 
 
+def attempt_timing(quiz, time_took):
+    """
+    Bound a client-reported attempt time by the quiz's own duration.
+
+    Returns:
+      A (time_took_to_attempt_test, duration_quiz) tuple in seconds; the time is
+      clamped to 0..duration and the duration is the quiz's, not the client's.
+      Raises ValueError if the reported time is not a number.
+    """
+    if time_took is not None:
+        if isinstance(time_took, bool) or not isinstance(time_took, (int, float)):
+            raise ValueError('time_took_to_attempt_test must be a number of seconds')
+        time_took = max(0, int(time_took))
+    try:
+        duration = int(parse_duration(quiz.time_duration).total_seconds())
+    except ValueError as e:
+        print(f"Storing unbounded attempt time for quiz {quiz.id}: {e}")
+        return time_took, None
+    if time_took is not None:
+        time_took = min(time_took, duration)
+    return time_took, duration
+
+
 class UserQuizScoreResource(Resource):
     @auth_required('token')
     @roles_required('user')
     def post(self, subject_id, chapter_id, quiz_id):
         """
-        Create a new score entry for a user's quiz attempt.
+        Grade a user's quiz attempt and create a new score entry for it.
+
+        The raw answer map ({question_id: option}) is graded on the server
+        against the quiz's cached answer key. The reported attempt time is
+        clamped to the quiz's duration, which is stored in place of the
+        client's duration_quiz.
         """
+        quiz = Quiz.query.get(quiz_id)
+        if not quiz:
+            return make_response(jsonify({'message': 'Quiz not found'}), 404)
         try:
-            data = request.get_json()
-            total_scored = data.get('total_scored')
-            total_marks = data.get('total_marks')
+            data = request.get_json(silent=True) or {}
+            answers = data.get('answers') or {}
+            if not isinstance(answers, dict):
+                return make_response(jsonify({'message': 'Answers must be a mapping of question ID to option'}), 400)
+            try:
+                time_took_to_attempt_test, duration_quiz = attempt_timing(quiz, data.get('time_took_to_attempt_test'))
+            except ValueError as e:
+                return make_response(jsonify({'message': str(e)}), 400)
+            total_scored, total_marks, responses = grade_attempt(quiz.id, answers)
             remarks = data.get('remarks')  # You can store additional information here
             tab_changes = data.get('tab_changes')
-            time_took_to_attempt_test = data.get('time_took_to_attempt_test')
-            duration_quiz = data.get('duration_quiz')
-
-            # You might want to add validation here to ensure the data is valid
 
             new_score = Score(
                 quiz_id=quiz_id,
@@ -702,11 +1007,19 @@ class UserQuizScoreResource(Resource):
                 tab_changes=tab_changes,
                 time_took_to_attempt_test=time_took_to_attempt_test,
                 duration_quiz=duration_quiz,
+                responses=responses,
             )
             db.session.add(new_score)
+            db.session.flush()
+            record_score(new_score)
             db.session.commit()
+            invalidate_score_views([(new_score.quiz_id, new_score.user_id)])
 
-            return make_response(jsonify({'message': 'Score recorded successfully'}), 201)
+            return make_response(jsonify({
+                'message': 'Score recorded successfully',
+                'total_scored': total_scored,
+                'total_marks': total_marks,
+            }), 201)
         except Exception as e:
             db.session.rollback()
             return make_response(jsonify({'message': 'Failed to record score', 'error': str(e)}), 500)
@@ -720,46 +1033,141 @@ class UserQuizRecordingResource(Resource):
     @roles_required('user')
     def post(self, subject_id, chapter_id, quiz_id):
         """
-        Upload quiz recording (video + audio) to Uploadcare and store URLs in Score model.
+        Accept a quiz recording (video + audio) and upload it in the background.
+
+        The files are spooled to local disk and a Celery task pushes them to the
+        recording storage backend and stores their URLs in the Score model.
+        Returns 202 with the ID of the task to poll.
         """
+        import uuid
+        from flask import current_app
+        from tasks import upload_recording
         try:
-            print("Request received")  # Debug print
-
             if 'video' not in request.files or 'audio' not in request.files:
-                print("Missing video or audio file")  # Debug print
                 return make_response(jsonify({'message': 'Missing video or audio file'}), 400)
 
             video_file = request.files['video']
             audio_file = request.files['audio']
 
             if video_file.filename == '' or audio_file.filename == '':
-                print("No selected video or audio file")  # Debug print
                 return make_response(jsonify({'message': 'No selected video or audio file'}), 400)
 
-            print("Uploading files to Uploadcare")  # Debug print
-            # Upload the files to Uploadcare
-            video_url = uploadcare.upload(video_file)
-            audio_url = uploadcare.upload(audio_file)
-            print(video_url)
-            print(audio_url)
-            print("Files uploaded successfully")  # Debug print
-
-            print("Storing URLs in Score model")  # Debug print
-            # Store the URLs in the Score model
-            score = Score.query.filter_by(user_id=current_user.id, quiz_id=quiz_id).first()
-            if score:
-                score.recording_url = f"video:{video_url}, audio:{audio_url}"
-                db.session.commit()
-            print("URLs stored in Score model")  # Debug print
+            spool_dir = os.path.join(current_app.root_path, current_app.config['RECORDINGS_SPOOL_DEST'], uuid.uuid4().hex)
+            os.makedirs(spool_dir)
+            files = {}
+            for kind, file in (('video', video_file), ('audio', audio_file)):
+                files[kind] = kind + os.path.splitext(secure_filename(file.filename))[1]
+                file.save(os.path.join(spool_dir, files[kind]))
 
-            print("Returning success response")  # Debug print
-            return make_response(jsonify({'message': 'Recording uploaded successfully'}), 201)
+            task = upload_recording.delay(current_user.id, quiz_id, spool_dir, files)
+            return make_response(jsonify({'message': 'Recording upload queued', 'task_id': task.id}), 202)
         except Exception as e:
-            print(f"Error uploading recording: {e}")  # Debug print with exception details
+            print(f"Error queuing recording upload: {e}")
             return make_response(jsonify({'message': 'Failed to upload recording', 'error': str(e)}), 500)
+
+    @auth_required('token')
+    @roles_required('user')
+    def get(self, subject_id, chapter_id, quiz_id):
+        """
+        Get the upload status of the user's recording for a quiz.
+
+        Pass the 'task_id' returned by the upload to also get the task state.
+        """
+        from tasks import upload_recording
+        try:
+            score = Score.query.filter_by(user_id=current_user.id, quiz_id=quiz_id).first()
+            status = {'recording_url': score.recording_url if score else None}
+            task_id = request.args.get('task_id')
+            if task_id:
+                status['state'] = upload_recording.AsyncResult(task_id).state
+            return make_response(jsonify(status), 200)
+        except Exception as e:
+            return make_response(jsonify({'message': 'Failed to get recording status', 'error': str(e)}), 500)
         
 
 
+def upload_error_response(error):
+    return make_response(jsonify({'message': error.message}), error.status)
+
+
+class RecordingUploadSessionResource(Resource):
+    @auth_required('token')
+    @roles_required('user')
+    def post(self, subject_id, chapter_id, quiz_id):
+        """
+        Start a resumable recording upload.
+
+        Accepts optional 'video_extension'/'audio_extension' (default '.webm') and
+        returns the upload ID to PUT numbered chunks to.
+        """
+        data = request.get_json(silent=True) or {}
+        extensions = {}
+        for kind in RECORDING_KINDS:
+            extension = data.get(f'{kind}_extension', '.webm')
+            if not isinstance(extension, str):
+                return make_response(jsonify({'message': f'{kind}_extension must be a string'}), 400)
+            extensions[kind] = os.path.splitext(secure_filename('file' + extension))[1]
+        try:
+            upload_id = create_session(current_user.id, quiz_id, extensions)
+            return make_response(jsonify({'message': 'Upload started', 'upload_id': upload_id}), 201)
+        except Exception as e:
+            return make_response(jsonify({'message': 'Failed to start upload', 'error': str(e)}), 500)
+
+    @auth_required('token')
+    @roles_required('user')
+    def get(self, subject_id, chapter_id, quiz_id, upload_id):
+        """
+        Get the chunks received so far, so an interrupted client knows what to resend.
+        """
+        try:
+            load_session(upload_id, current_user.id, quiz_id)
+            return make_response(jsonify({'upload_id': upload_id, 'received': received_chunks(upload_id)}), 200)
+        except UploadError as e:
+            return upload_error_response(e)
+
+
+class RecordingUploadChunkResource(Resource):
+    @auth_required('token')
+    @roles_required('user')
+    def put(self, subject_id, chapter_id, quiz_id, upload_id, kind, index):
+        """
+        Store one numbered chunk of the video or audio, streamed from the raw request body.
+
+        Chunks may be sent in any order and retried; a retry replaces the chunk.
+        """
+        try:
+            load_session(upload_id, current_user.id, quiz_id)
+            write_chunk(upload_id, kind, index, request.stream)
+            return make_response(jsonify({'message': 'Chunk stored', 'kind': kind, 'index': index}), 200)
+        except UploadError as e:
+            return upload_error_response(e)
+        except Exception as e:
+            return make_response(jsonify({'message': 'Failed to store chunk', 'error': str(e)}), 500)
+
+
+class RecordingUploadFinalizeResource(Resource):
+    @auth_required('token')
+    @roles_required('user')
+    def post(self, subject_id, chapter_id, quiz_id, upload_id):
+        """
+        Assemble the uploaded chunks, verify their checksums and queue the recording upload.
+
+        Expects {'video': {'chunks': n, 'sha256': hex}, 'audio': {...}} and returns
+        202 with the ID of the upload task, as the single-request upload does.
+        """
+        from tasks import upload_recording
+        try:
+            session = load_session(upload_id, current_user.id, quiz_id)
+            files = assemble(upload_id, session, request.get_json(silent=True) or {})
+            task = upload_recording.delay(current_user.id, quiz_id, session_dir(upload_id), files)
+            return make_response(jsonify({'message': 'Recording upload queued', 'task_id': task.id}), 202)
+        except UploadError as e:
+            return upload_error_response(e)
+        except Exception as e:
+            return make_response(jsonify({'message': 'Failed to finalize upload', 'error': str(e)}), 500)
+
+
+
 class UserQuizResultResource(Resource):
     @auth_required('token')
     @roles_required('user')
@@ -792,6 +1200,36 @@ class UserQuizResultResource(Resource):
 
 
 
+def quiz_access(user_id, chapter_id=None, quiz_id=None):
+    """
+    Determine whether a user can start or view the result of quizzes.
+
+    Quizzes are outer-joined with the user's scores and grouped, so the access
+    state of a whole chapter is resolved in a single query.
+
+    Args:
+      user_id: The ID of the user.
+      chapter_id: Optional ID restricting the result to the quizzes of a chapter.
+      quiz_id: Optional ID restricting the result to a single quiz.
+
+    Returns:
+      A list of dictionaries with 'quiz_id', 'can_start' and 'can_view_result'.
+    """
+    from sqlalchemy import and_, func
+    query = db.session.query(Quiz.id, func.count(Score.id)).outerjoin(
+        Score, and_(Score.quiz_id == Quiz.id, Score.user_id == user_id)
+    )
+    if chapter_id is not None:
+        query = query.filter(Quiz.chapter_id == chapter_id)
+    if quiz_id is not None:
+        query = query.filter(Quiz.id == quiz_id)
+
+    return [
+        {'quiz_id': access_quiz_id, 'can_start': attempts == 0, 'can_view_result': attempts > 0}
+        for access_quiz_id, attempts in query.group_by(Quiz.id).order_by(Quiz.id)
+    ]
+
+
 class UserQuizAccessResource(Resource):
     @auth_required('token')
     @roles_required('user')
@@ -800,25 +1238,188 @@ class UserQuizAccessResource(Resource):
         Check if the user can start or view the result of a quiz.
         """
         try:
-            quiz = Quiz.query.get_or_404(quiz_id)
-            score = Score.query.filter_by(user_id=current_user.id, quiz_id=quiz_id).first()
+            access = quiz_access(current_user.id, quiz_id=quiz_id)
+            if not access:
+                return make_response(jsonify({'message': 'Quiz not found'}), 404)
+            return make_response(jsonify({
+                'can_start': access[0]['can_start'],
+                'can_view_result': access[0]['can_view_result'],
+            }), 200)
 
-            # Check if the user has already attempted the quiz
-            if score:
-                return make_response(jsonify({'can_start': False, 'can_view_result': True}), 200)
-            else:
-                return make_response(jsonify({'can_start': True, 'can_view_result': False}), 200)
+        except Exception as e:
+            return make_response(jsonify({'message': 'Failed to check quiz access', 'error': str(e)}), 500)
 
+
+class UserChapterQuizAccessResource(Resource):
+    @auth_required('token')
+    @roles_required('user')
+    def get(self, subject_id, chapter_id):
+        """
+        Check whether the user can start or view the result of every quiz in a chapter.
+        """
+        try:
+            return make_response(jsonify(quiz_access(current_user.id, chapter_id=chapter_id)), 200)
         except Exception as e:
             return make_response(jsonify({'message': 'Failed to check quiz access', 'error': str(e)}), 500)
 
 
+SUMMARY_UPCOMING_LIMIT = 10
+# Upcoming quizzes move into the past on their own, so summaries also expire
+SUMMARY_CACHE_TIMEOUT = 5 * 60
+
+
+def _summary_progress(attempted, total, percentage_sum, percentage_count):
+    return {
+        'attempted': attempted,
+        'total': total,
+        'average_percentage': round(percentage_sum / percentage_count, 1) if percentage_count else None,
+    }
+
+
+def _summary_attempt(row):
+    if row is None:
+        return None
+    return {
+        'score_id': row.id,
+        'quiz_id': row.quiz_id,
+        'quiz_name': row.quiz_name,
+        'chapter_id': row.chapter_id,
+        'total_scored': row.total_scored,
+        'total_marks': row.total_marks,
+        'time_stamp_of_attempt': row.time_stamp_of_attempt,
+    }
+
+
+def user_summary(user_id, now=None):
+    """
+    Build a user's dashboard progress summary with a handful of grouped queries.
+
+    One query counts the quizzes of every chapter, one aggregates the user's
+    scores per chapter, and three short indexed queries fetch the best and
+    latest attempts and the upcoming quizzes not attempted yet. Subject totals
+    are rolled up from the chapter rows.
+
+    Quizzes created through the API are dated at midnight and can be taken all
+    day, so "upcoming" starts at the beginning of today: today's unattempted
+    quizzes are still listed.
+
+    Args:
+      user_id: The ID of the user.
+      now: The reference time for upcoming quizzes (defaults to now).
+
+    Returns:
+      A dictionary with 'overall', 'subjects' (each with its 'chapters'),
+      'best_attempt', 'latest_attempt' and 'upcoming'.
+    """
+    from sqlalchemy import distinct, exists, func
+    now = now or datetime.now()
+    percentage = 100.0 * Score.total_scored / func.nullif(Score.total_marks, 0)
+
+    chapters = db.session.query(
+        Subject.id.label('subject_id'), Subject.name.label('subject_name'),
+        Chapter.id.label('chapter_id'), Chapter.name.label('chapter_name'),
+        func.count(Quiz.id).label('total'),
+    ).outerjoin(Chapter, Chapter.subject_id == Subject.id).outerjoin(
+        Quiz, Quiz.chapter_id == Chapter.id
+    ).group_by(Subject.id, Chapter.id).order_by(Subject.id, Chapter.id).all()
+
+    progress = {
+        row.chapter_id: row for row in db.session.query(
+            Quiz.chapter_id,
+            func.count(distinct(Score.quiz_id)).label('attempted'),
+            func.coalesce(func.sum(percentage), 0).label('percentage_sum'),
+            func.count(percentage).label('percentage_count'),
+        ).join(Quiz, Score.quiz_id == Quiz.id).filter(Score.user_id == user_id).group_by(Quiz.chapter_id)
+    }
+
+    subjects = {}
+    for row in chapters:
+        subject = subjects.setdefault(row.subject_id, {
+            'subject_id': row.subject_id, 'name': row.subject_name, 'chapters': [], '_totals': [0, 0, 0, 0],
+        })
+        if row.chapter_id is None:
+            continue
+        chapter = progress.get(row.chapter_id)
+        totals = (chapter.attempted, row.total, chapter.percentage_sum, chapter.percentage_count) if chapter \
+            else (0, row.total, 0, 0)
+        subject['chapters'].append(dict(
+            _summary_progress(*totals), chapter_id=row.chapter_id, name=row.chapter_name,
+        ))
+        subject['_totals'] = [a + b for a, b in zip(subject['_totals'], totals)]
+
+    overall = [0, 0, 0, 0]
+    for subject in subjects.values():
+        totals = subject.pop('_totals')
+        subject.update(_summary_progress(*totals))
+        overall = [a + b for a, b in zip(overall, totals)]
+
+    attempts = db.session.query(
+        Score.id, Score.quiz_id, Score.total_scored, Score.total_marks, Score.time_stamp_of_attempt,
+        Quiz.remarks.label('quiz_name'), Quiz.chapter_id,
+    ).join(Quiz, Score.quiz_id == Quiz.id).filter(Score.user_id == user_id)
+    best = attempts.filter(percentage.isnot(None)).order_by(percentage.desc(), Score.id).first()
+    latest = attempts.order_by(Score.time_stamp_of_attempt.desc(), Score.id.desc()).first()
+
+    attempted = exists().where(Score.quiz_id == Quiz.id, Score.user_id == user_id)
+    upcoming = db.session.query(
+        Quiz.id, Quiz.remarks, Quiz.date_of_quiz, Quiz.time_duration, Quiz.chapter_id, Chapter.subject_id,
+    ).join(Chapter, Quiz.chapter_id == Chapter.id).filter(
+        Quiz.date_of_quiz >= datetime.combine(now.date(), datetime.min.time()), ~attempted
+    ).order_by(Quiz.date_of_quiz, Quiz.id).limit(SUMMARY_UPCOMING_LIMIT)
+
+    return {
+        'overall': _summary_progress(*overall),
+        'subjects': list(subjects.values()),
+        'best_attempt': _summary_attempt(best),
+        'latest_attempt': _summary_attempt(latest),
+        'upcoming': [{
+            'quiz_id': row.id,
+            'name': row.remarks,
+            'date_of_quiz': row.date_of_quiz,
+            'time_duration': row.time_duration,
+            'chapter_id': row.chapter_id,
+            'subject_id': row.subject_id,
+        } for row in upcoming],
+    }
+
+
+class UserSummaryResource(Resource):
+    @auth_required('token')
+    @roles_required('user')
+    @cached_resource('user_scores:{user_id}', 'catalog', per_user=True, timeout=SUMMARY_CACHE_TIMEOUT)
+    def get(self):
+        """
+        Get the user's progress per subject and chapter, best and latest attempts and upcoming quizzes.
+        """
+        try:
+            return make_response(jsonify(user_summary(current_user.id)), 200)
+        except Exception as e:
+            return make_response(jsonify({'message': 'Failed to build summary', 'error': str(e)}), 500)
+
+def invalidate_score_views(affected):
+    """
+    Invalidate the cached views built from scores.
+
+    Args:
+      affected: (quiz_id, user_id) pairs of the scores that changed.
+    """
+    tags = set()
+    for quiz_id, user_id in affected:
+        tags.add(f'scores:{quiz_id}')
+        tags.add(f'user_scores:{user_id}')
+    if tags:
+        invalidate_tags(*tags)
+
+
 class AdminScoreFlagResource(Resource):
     @auth_required('token')
     @roles_required('admin')
     def put(self, score_id):
         """
         Flag a score for review by admin.
+
+        A manual flag (or unflag) overrides the automatic anomaly flag, which
+        the scorer will no longer change for this score.
         """
         try:
             score = Score.query.get_or_404(score_id)
@@ -827,7 +1428,9 @@ class AdminScoreFlagResource(Resource):
 
             if flag is not None:
                 score.flagged = flag  # Update the flagged attribute of the Score object
+                score.flag_source = 'manual'
                 db.session.commit()
+                invalidate_score_views([(score.quiz_id, score.user_id)])
                 return make_response(jsonify({'message': 'Score flagged successfully'}), 200)
             else:
                 return make_response(jsonify({'message': 'Flag value is required'}), 400)
@@ -837,29 +1440,313 @@ class AdminScoreFlagResource(Resource):
 
 
 
+SCORE_PAGE_SIZE = 100
+SCORE_PAGE_SIZE_MAX = 500
+SCORE_STREAM_CHUNK = 1000
+
+SCORE_LISTING_COLUMNS = (
+    Score.id, Score.quiz_id, Score.user_id, Score.time_stamp_of_attempt,
+    Score.total_scored, Score.total_marks, Score.remarks, Score.tab_changes,
+    Score.time_took_to_attempt_test, Score.duration_quiz, Score.recording_url,
+    Score.flagged, Score.flag_source, Score.anomaly_score, Score.anomaly_reasons,
+)
+
+
+def parse_date_arg(value):
+    """Parse an optional YYYY-MM-DD query argument, raising ValueError if malformed."""
+    return datetime.strptime(value, '%Y-%m-%d') if value else None
+
+
+SCORE_FILTER_KEYS = ('quiz_id', 'user_id', 'flagged', 'min_tab_changes', 'date_from', 'date_to')
+
+
+def score_filter_criteria(args):
+    """
+    Translate score filter arguments into SQL criteria.
+
+    Args:
+      args: A MultiDict of filters: 'quiz_id', 'user_id', 'flagged' (true/false),
+        'min_tab_changes', 'date_from' and 'date_to' (YYYY-MM-DD, inclusive).
+
+    Returns:
+      A list of criteria for Query.filter.
+    """
+    criteria = []
+    quiz_id = args.get('quiz_id', type=int)
+    if quiz_id is not None:
+        criteria.append(Score.quiz_id == quiz_id)
+    user_id = args.get('user_id', type=int)
+    if user_id is not None:
+        criteria.append(Score.user_id == user_id)
+    flagged = args.get('flagged')
+    if flagged is not None:
+        criteria.append(Score.flagged == (flagged.lower() in ('1', 'true', 'yes')))
+    min_tab_changes = args.get('min_tab_changes', type=int)
+    if min_tab_changes is not None:
+        criteria.append(Score.tab_changes >= min_tab_changes)
+    date_from = parse_date_arg(args.get('date_from'))
+    if date_from:
+        criteria.append(Score.time_stamp_of_attempt >= date_from)
+    date_to = parse_date_arg(args.get('date_to'))
+    if date_to:
+        criteria.append(Score.time_stamp_of_attempt < date_to + timedelta(days=1))
+    return criteria
+
+
+def score_listing_query(args):
+    """
+    Build the projected admin score listing query from request arguments.
+
+    Scores are joined with their quiz and user in the same statement and only
+    the columns needed for the listing are selected, so no ORM objects or lazy
+    relationship loads are involved.
+
+    Args:
+      args: The request arguments, filtered as in score_filter_criteria.
+
+    Returns:
+      A query ordered by score ID, ready for keyset pagination.
+    """
+    query = db.session.query(
+        *SCORE_LISTING_COLUMNS,
+        Quiz.remarks.label('quiz_name'),
+        User.email.label('user_email'),
+    ).outerjoin(Quiz, Score.quiz_id == Quiz.id).outerjoin(User, Score.user_id == User.id)
+    return query.filter(*score_filter_criteria(args)).order_by(Score.id)
+
+
+def stream_score_listing(query):
+    """Yield the score listing as a JSON array, one chunk of rows at a time."""
+    from flask import json
+    yield '['
+    first = True
+    for row in query.yield_per(SCORE_STREAM_CHUNK):
+        yield ('' if first else ',') + json.dumps(row._asdict())
+        first = False
+    yield ']'
+
+
 class AdminScoreResource(Resource):
     @auth_required('token')
     @roles_required('admin')
     def get(self):
         """
-        Get all scores (admin only).
+        Get scores (admin only), keyset-paginated by score ID.
+
+        Pass 'cursor' (the 'next_cursor' of the previous page) and 'limit' to page
+        through results, or 'stream=true' to receive every matching score as a
+        JSON array written incrementally.
         """
+        from flask import Response, stream_with_context
         try:
-            scores = Score.query.all()
-            score_list = []
-            for score in scores:
-                score_data = score.to_dict()
-                score_data['quiz_name'] = score.quiz.remarks  # Add quiz name
-                score_data['user_email'] = score.user.email  # Add user email
-                score_list.append(score_data)
-
-            return make_response(jsonify(score_list), 200)
+            query = score_listing_query(request.args)
+        except ValueError:
+            return make_response(jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400)
+
+        try:
+            if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+                return Response(stream_with_context(stream_score_listing(query)), mimetype='application/json')
+
+            limit = max(1, min(request.args.get('limit', SCORE_PAGE_SIZE, type=int), SCORE_PAGE_SIZE_MAX))
+            cursor = request.args.get('cursor', type=int)
+            if cursor is not None:
+                query = query.filter(Score.id > cursor)
+
+            score_list = [row._asdict() for row in query.limit(limit + 1)]
+            next_cursor = None
+            if len(score_list) > limit:
+                score_list = score_list[:limit]
+                next_cursor = score_list[-1]['id']
+
+            return make_response(jsonify({'scores': score_list, 'next_cursor': next_cursor}), 200)
         except Exception as e:
             return make_response(jsonify({'message': 'Failed to retrieve scores', 'error': str(e)}), 500)
         
 
 
 
+SCORE_MODERATION_MAX_IDS = 5000
+
+
+class AdminScoreModerationResource(Resource):
+    @auth_required('token')
+    @roles_required('admin')
+    def post(self):
+        """
+        Flag, unflag or annotate many scores at once (admin only).
+
+        Scores are selected by 'score_ids' and/or a 'filter' object (quiz_id,
+        user_id, flagged, min_tab_changes, date_from, date_to). 'flag' (boolean)
+        and 'remarks' (string, or null to clear) are applied with a single UPDATE
+        in one transaction; flags set here override the automatic anomaly flag.
+
+        Returns the number of scores updated.
+        """
+        from werkzeug.datastructures import MultiDict
+        data = request.get_json(silent=True) or {}
+        score_ids = data.get('score_ids')
+        filters = data.get('filter') or {}
+
+        if not isinstance(filters, dict):
+            return make_response(jsonify({'message': 'Filter must be an object'}), 400)
+        unknown = sorted(set(filters) - set(SCORE_FILTER_KEYS))
+        if unknown:
+            return make_response(jsonify({'message': f"Unknown filter keys: {', '.join(unknown)}"}), 400)
+
+        criteria = []
+        try:
+            if score_ids is not None:
+                if not isinstance(score_ids, list) or len(score_ids) > SCORE_MODERATION_MAX_IDS:
+                    return make_response(jsonify({
+                        'message': f'score_ids must be a list of at most {SCORE_MODERATION_MAX_IDS} IDs'
+                    }), 400)
+                criteria.append(Score.id.in_([int(score_id) for score_id in score_ids]))
+            if 'flagged' in filters and not isinstance(filters['flagged'], bool):
+                raise ValueError('flagged must be true or false')
+            # Listing arguments that fail to parse are ignored, so every filter
+            # given here must come back as a criterion or the update would widen
+            filter_criteria = score_filter_criteria(MultiDict({
+                key: str(value).lower() if isinstance(value, bool) else str(value)
+                for key, value in filters.items() if value is not None
+            }))
+            if len(filter_criteria) != len(filters):
+                raise ValueError('invalid filter value')
+            criteria.extend(filter_criteria)
+        except (TypeError, ValueError):
+            return make_response(jsonify({'message': 'Invalid score IDs or filter values'}), 400)
+        if not criteria:
+            return make_response(jsonify({'message': 'Provide score_ids or a filter'}), 400)
+
+        values = {}
+        if data.get('flag') is not None:
+            if not isinstance(data['flag'], bool):
+                return make_response(jsonify({'message': 'Flag must be true or false'}), 400)
+            values.update({Score.flagged: data['flag'], Score.flag_source: 'manual'})
+        if 'remarks' in data:
+            values[Score.remarks] = data['remarks']
+        if not values:
+            return make_response(jsonify({'message': 'Nothing to change. Provide flag and/or remarks'}), 400)
+
+        try:
+            affected = db.session.query(Score.quiz_id, Score.user_id).filter(*criteria).distinct().all()
+            updated = db.session.query(Score).filter(*criteria).update(values, synchronize_session=False)
+            db.session.commit()
+            invalidate_score_views(affected)
+            return make_response(jsonify({'message': 'Scores updated', 'updated': updated}), 200)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({'message': 'Failed to update scores', 'error': str(e)}), 500)
+
+
+class AdminScoreExportResource(Resource):
+    @auth_required('token')
+    @roles_required('admin')
+    def post(self):
+        """
+        Start a background export of scores to CSV or XLSX (admin only).
+
+        Accepts 'format' and the same filters as the score listing, and returns
+        the ID of the Celery task to poll.
+        """
+        from tasks import export_scores, EXPORT_FORMATS
+        data = request.get_json(silent=True) or {}
+        file_type = data.get('format', 'csv')
+        if file_type not in EXPORT_FORMATS:
+            return make_response(jsonify({'message': 'Invalid format. Use csv or xlsx'}), 400)
+
+        filters = {key: data[key] for key in ('quiz_id', 'user_id', 'flagged', 'min_tab_changes', 'date_from', 'date_to')
+                   if data.get(key) is not None}
+        filters = {key: str(value).lower() if isinstance(value, bool) else str(value) for key, value in filters.items()}
+        try:
+            parse_date_arg(filters.get('date_from'))
+            parse_date_arg(filters.get('date_to'))
+        except ValueError:
+            return make_response(jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400)
+
+        try:
+            task = export_scores.delay(file_type, filters)
+            return make_response(jsonify({'message': 'Export started', 'task_id': task.id}), 202)
+        except Exception as e:
+            return make_response(jsonify({'message': 'Failed to start export', 'error': str(e)}), 500)
+
+
+class AdminScoreExportStatusResource(Resource):
+    @auth_required('token')
+    @roles_required('admin')
+    def get(self, task_id):
+        """
+        Get the state and progress of a score export (admin only).
+        """
+        from tasks import export_scores
+        result = export_scores.AsyncResult(task_id)
+        status = {'task_id': task_id, 'state': result.state}
+        if result.state == 'PROGRESS' or result.successful():
+            status.update({'done': result.info.get('done'), 'total': result.info.get('total')})
+        elif result.failed():
+            status['error'] = str(result.info)
+        return make_response(jsonify(status), 200)
+
+
+class AdminScoreAnomalyResource(Resource):
+    @auth_required('token')
+    @roles_required('admin')
+    def post(self):
+        """
+        Re-run anomaly scoring in the background (admin only).
+
+        Accepts an optional 'quiz_id' (all quizzes otherwise) and returns the ID
+        of the Celery task to poll.
+        """
+        from tasks import score_anomalies
+        data = request.get_json(silent=True) or {}
+        quiz_id = data.get('quiz_id')
+        try:
+            quiz_ids = [int(quiz_id)] if quiz_id is not None else None
+        except (TypeError, ValueError):
+            return make_response(jsonify({'message': 'Invalid quiz ID'}), 400)
+        try:
+            task = score_anomalies.delay(quiz_ids)
+            return make_response(jsonify({'message': 'Anomaly scoring started', 'task_id': task.id}), 202)
+        except Exception as e:
+            return make_response(jsonify({'message': 'Failed to start anomaly scoring', 'error': str(e)}), 500)
+
+
+class AdminScoreAnomalyStatusResource(Resource):
+    @auth_required('token')
+    @roles_required('admin')
+    def get(self, task_id):
+        """
+        Get the state and result of an anomaly scoring run (admin only).
+        """
+        from tasks import score_anomalies
+        result = score_anomalies.AsyncResult(task_id)
+        status = {'task_id': task_id, 'state': result.state}
+        if result.successful():
+            status.update(result.result)
+        elif result.failed():
+            status['error'] = str(result.info)
+        return make_response(jsonify(status), 200)
+
+
+class AdminScoreExportDownloadResource(Resource):
+    @auth_required('token')
+    @roles_required('admin')
+    def get(self, task_id):
+        """
+        Download a finished score export (admin only). Supports HTTP Range requests.
+        """
+        from flask import send_file
+        from tasks import export_scores, export_path
+        result = export_scores.AsyncResult(task_id)
+        if not result.successful():
+            return make_response(jsonify({'message': 'Export is not ready', 'state': result.state}), 409)
+
+        filename = result.result['filename']
+        path = export_path(filename)
+        if not os.path.exists(path):
+            return make_response(jsonify({'message': 'Export file not found'}), 404)
+        return send_file(path, as_attachment=True, download_name=filename, conditional=True)
+
 
 class ChatNamespace(Namespace):
     
@@ -901,22 +1788,16 @@ class ChatNamespace(Namespace):
                 emit('error', {'message': 'Could not determine recipient'})
                 return
 
-            # Save new message to the database
-            new_message = ChatMessage(
-                sender_id=user.id,
-                recipient_id=recipient_id,
-                message=message
-            )
-            db.session.add(new_message)
-            db.session.commit()
+            # Queue the message for write-behind persistence and deliver it right away
+            new_message = chat_writer.enqueue(user.id, recipient_id, message, room=room)
 
             # Emit the message to the room
             emit('new_message', {
-                'id': new_message.id,
-                'sender_id': new_message.sender_id,
+                'id': new_message['id'],
+                'sender_id': new_message['sender_id'],
                 'sender_name': user.email,
-                'message': new_message.message,
-                'timestamp': new_message.timestamp.isoformat()
+                'message': new_message['message'],
+                'timestamp': new_message['timestamp'].isoformat()
             }, room=room)
 
         except Exception as e:
@@ -945,11 +1826,10 @@ def determine_recipient(user, room):
             return user_id
         else:
             # If the sender is a regular user, the recipient is the admin
-            admin = User.query.filter_by(email='admin@example.com').first()
-            if admin:
-                print(f"Determined recipient admin_id: {admin.id} (user sending message to admin)")
-                return admin.id
-            return None
+            admin_id = admin_user_id()
+            if admin_id:
+                print(f"Determined recipient admin_id: {admin_id} (user sending message to admin)")
+            return admin_id
     except (ValueError, AttributeError, IndexError) as e:
         # Handle potential errors in parsing the room name or fetching the user/admin
         print(f"Error determining recipient: {e}")
@@ -958,24 +1838,177 @@ def determine_recipient(user, room):
 
 
 
+CHAT_PAGE_SIZE = 50
+CHAT_PAGE_SIZE_MAX = 200
+
+
+def chat_history(user_id, counterpart_id=None, before_id=None, since_id=None, limit=CHAT_PAGE_SIZE):
+    """
+    Get a page of a user's chat history, oldest first.
+
+    Sent and received messages are fetched with two queries that each walk the
+    (participant, id) index and are merged, so a page never scans the full
+    history.
+
+    Args:
+      user_id: The ID of the user whose history is returned.
+      counterpart_id: Optional ID of the other participant to restrict to one conversation.
+      before_id: Return the latest messages older than this ID (scrolling back).
+      since_id: Return the earliest messages newer than this ID (incremental sync).
+      limit: The maximum number of messages returned.
+
+    Returns:
+      A list of ChatMessage objects ordered by ID.
+    """
+    sent = ChatMessage.query.filter(ChatMessage.sender_id == user_id)
+    received = ChatMessage.query.filter(ChatMessage.recipient_id == user_id)
+    if counterpart_id is not None:
+        sent = sent.filter(ChatMessage.recipient_id == counterpart_id)
+        received = received.filter(ChatMessage.sender_id == counterpart_id)
+
+    if since_id is not None:
+        order = ChatMessage.id.asc()
+        sent = sent.filter(ChatMessage.id > since_id)
+        received = received.filter(ChatMessage.id > since_id)
+    else:
+        order = ChatMessage.id.desc()
+        if before_id is not None:
+            sent = sent.filter(ChatMessage.id < before_id)
+            received = received.filter(ChatMessage.id < before_id)
+
+    # A message to oneself appears on both sides, hence the merge by ID
+    merged = {message.id: message for message in sent.order_by(order).limit(limit)}
+    merged.update((message.id, message) for message in received.order_by(order).limit(limit))
+    ids = sorted(merged, reverse=since_id is None)[:limit]
+    return [merged[message_id] for message_id in sorted(ids)]
+
+
 class ChatMessageResource(Resource):
     @auth_required('token')
     def get(self):  # Removed @roles_required
         """
-        Get all chat messages for the current user (both users and admins).
+        Get a page of chat messages for the current user (both users and admins).
+
+        Query arguments: 'limit', 'before_id' to scroll back, 'since_id' to fetch
+        only messages newer than the last one seen, and 'with_user' to restrict
+        to the conversation with one counterpart.
         """
         try:
-            user = current_user
-            messages = ChatMessage.query.filter(
-                (ChatMessage.sender_id == user.id) | (ChatMessage.recipient_id == user.id)
-            ).order_by(ChatMessage.timestamp).all()
-
+            limit = max(1, min(request.args.get('limit', CHAT_PAGE_SIZE, type=int), CHAT_PAGE_SIZE_MAX))
+            messages = chat_history(
+                current_user.id,
+                counterpart_id=request.args.get('with_user', type=int),
+                before_id=request.args.get('before_id', type=int),
+                since_id=request.args.get('since_id', type=int),
+                limit=limit,
+            )
             return make_response(jsonify([message.to_dict() for message in messages]), 200)
         except Exception as e:
             return make_response(jsonify({'message': 'Failed to retrieve messages', 'error': str(e)}), 500)
 
 
 
+class AdminCacheStatsResource(Resource):
+    @auth_required('token')
+    @roles_required('admin')
+    def get(self):
+        """
+        Get the response cache hit, miss, invalidation, error and eviction counters (admin only).
+
+        Evictions come from the cache backend (Redis' evicted_keys) and are null
+        on backends that do not report them.
+        """
+        return make_response(jsonify(cache_stats()), 200)
+
+
+class AdminActiveUsersResource(Resource):
+    @auth_required('token')
+    @roles_required('admin')
+    def get(self):
+        from flask import current_app
+        """
+        Count the users active within ACTIVE_NOW_WINDOW seconds (admin only).
+        """
+        try:
+            window = current_app.config['ACTIVE_NOW_WINDOW']
+            return make_response(jsonify({'active_now': active_user_count(window), 'window_seconds': window}), 200)
+        except Exception as e:
+            return make_response(jsonify({'message': 'Failed to count active users', 'error': str(e)}), 500)
+
+
+def leaderboard_payload(leaderboard):
+    """Attach the display names of the users on a leaderboard, with one query."""
+    user_ids = [entry['user_id'] for entry in leaderboard]
+    names = dict(db.session.query(User.id, User.full_name).filter(User.id.in_(user_ids))) if user_ids else {}
+    return [
+        dict(entry, rank=position, full_name=names.get(entry['user_id']))
+        for position, entry in enumerate(leaderboard, start=1)
+    ]
+
+
+class AdminQuizStatsResource(Resource):
+    @auth_required('token')
+    @roles_required('admin')
+    def get(self, quiz_id):
+        """
+        Get a quiz's score statistics and leaderboard (admin only).
+
+        Served from the incrementally maintained QuizStats row; no Score scan.
+        """
+        try:
+            stats = QuizStats.query.get(quiz_id)
+            if stats is None:
+                return make_response(jsonify({'message': 'No attempts recorded for this quiz'}), 404)
+            payload = stats_payload(stats)
+            payload['leaderboard'] = leaderboard_payload(stats.leaderboard or [])
+            return make_response(jsonify(payload), 200)
+        except Exception as e:
+            return make_response(jsonify({'message': 'Failed to retrieve quiz statistics', 'error': str(e)}), 500)
+
+# New attempts only refresh the analysis after this many seconds; question edits do immediately
+ITEM_ANALYSIS_CACHE_TIMEOUT = 10 * 60
+
+
+class AdminQuizItemAnalysisResource(Resource):
+    @auth_required('token')
+    @roles_required('admin')
+    @cached_resource('questions:{quiz_id}', timeout=ITEM_ANALYSIS_CACHE_TIMEOUT)
+    def get(self, quiz_id):
+        """
+        Get per-question difficulty, discrimination and option frequencies of a quiz (admin only).
+        """
+        try:
+            return make_response(jsonify(quiz_item_analysis(quiz_id)), 200)
+        except Exception as e:
+            return make_response(jsonify({'message': 'Failed to analyse quiz items', 'error': str(e)}), 500)
+
+
+class UserQuizLeaderboardResource(Resource):
+    @auth_required('token')
+    @roles_required('user')
+    def get(self, subject_id, chapter_id, quiz_id):
+        """
+        Get a quiz's leaderboard with the current user's best score, rank and percentile.
+
+        The rank is a bisect over each participant's best attempt, kept sorted in
+        leaderboard order in QuizStats, so it matches the user's position on the
+        leaderboard without scanning Score.
+        """
+        try:
+            stats = QuizStats.query.get(quiz_id)
+            if stats is None:
+                return make_response(jsonify({'leaderboard': [], 'attempts': 0, 'you': None}), 200)
+
+            return make_response(jsonify({
+                'leaderboard': leaderboard_payload(stats.leaderboard or []),
+                'attempts': stats.attempts,
+                'you': user_standing(stats, current_user.id),
+            }), 200)
+        except Exception as e:
+            return make_response(jsonify({'message': 'Failed to retrieve leaderboard', 'error': str(e)}), 500)
+
+
+
 class CurrentUserResource(Resource):
     @auth_required('token')
     def get(self):
@@ -994,6 +2027,13 @@ api.add_resource(CurrentUserResource, '/api/user/current_user_id')
 
 
 
+api.add_resource(AdminCacheStatsResource, '/api/admin/cache/stats')
+api.add_resource(AdminActiveUsersResource, '/api/admin/users/active')
+api.add_resource(AdminQuizStatsResource, '/api/admin/quizzes/<int:quiz_id>/stats')
+api.add_resource(AdminQuizItemAnalysisResource, '/api/admin/quizzes/<int:quiz_id>/item-analysis')
+api.add_resource(UserQuizLeaderboardResource,
+                 '/api/user/subjects/<int:subject_id>/chapters/<int:chapter_id>/quizzes/<int:quiz_id>/leaderboard')
+
 # API registration
 api.add_resource(ChatMessageResource, '/api/chat_messages')  
         
@@ -1008,10 +2048,19 @@ api.add_resource(AdminScoreResource, '/api/admin/scores')
 
 
 
+api.add_resource(AdminScoreModerationResource, '/api/admin/scores/moderate')
+api.add_resource(AdminScoreExportResource, '/api/admin/scores/export')
+api.add_resource(AdminScoreExportStatusResource, '/api/admin/scores/export/<string:task_id>')
+api.add_resource(AdminScoreExportDownloadResource, '/api/admin/scores/export/<string:task_id>/download')
+api.add_resource(AdminScoreAnomalyResource, '/api/admin/scores/anomalies')
+api.add_resource(AdminScoreAnomalyStatusResource, '/api/admin/scores/anomalies/<string:task_id>')
+
 api.add_resource(AdminScoreFlagResource, '/api/admin/scores/<int:score_id>/flag')
 
 
 # API registration
+api.add_resource(UserSummaryResource, '/api/user/summary')
+api.add_resource(UserChapterQuizAccessResource, '/api/user/subjects/<int:subject_id>/chapters/<int:chapter_id>/quizzes/access')
 api.add_resource(UserQuizAccessResource, '/api/user/subjects/<int:subject_id>/chapters/<int:chapter_id>/quizzes/<int:quiz_id>/access')
 
 
@@ -1022,6 +2071,14 @@ api.add_resource(UserQuizResultResource, '/api/user/subjects/<int:subject_id>/ch
 
 api.add_resource(UserQuizRecordingResource, '/api/user/subjects/<int:subject_id>/chapters/<int:chapter_id>/quizzes/<int:quiz_id>/recording')
 
+api.add_resource(RecordingUploadSessionResource,
+                 '/api/user/subjects/<int:subject_id>/chapters/<int:chapter_id>/quizzes/<int:quiz_id>/recording/uploads',
+                 '/api/user/subjects/<int:subject_id>/chapters/<int:chapter_id>/quizzes/<int:quiz_id>/recording/uploads/<string:upload_id>')
+api.add_resource(RecordingUploadChunkResource,
+                 '/api/user/subjects/<int:subject_id>/chapters/<int:chapter_id>/quizzes/<int:quiz_id>/recording/uploads/<string:upload_id>/<string:kind>/<int:index>')
+api.add_resource(RecordingUploadFinalizeResource,
+                 '/api/user/subjects/<int:subject_id>/chapters/<int:chapter_id>/quizzes/<int:quiz_id>/recording/uploads/<string:upload_id>/finalize')
+
 api.add_resource(UserQuizScoreResource, '/api/user/subjects/<int:subject_id>/chapters/<int:chapter_id>/quizzes/<int:quiz_id>/score')
 
 api.add_resource(UserQuestionResource,
@@ -1041,12 +2098,17 @@ api.add_resource(UserChapterResource,
                  '/api/user/subjects/<int:subject_id>/chapters',
                  '/api/user/subjects/<int:subject_id>/chapters/<int:chapter_id>')
 
+api.add_resource(UserCatalogResource, '/api/user/catalog')
+
 api.add_resource(UserSubjectResource, '/api/user/subjects', '/api/user/subjects/<int:subject_id>')
 
 api.add_resource(ScoreResource, '/api/scores')
 
 
 
+api.add_resource(QuestionImportResource,
+                 '/api/subjects/<int:subject_id>/chapters/<int:chapter_id>/quizzes/<int:quiz_id>/questions/import')
+
 api.add_resource(QuestionResource, 
                  '/api/subjects/<int:subject_id>/chapters/<int:chapter_id>/quizzes/<int:quiz_id>/questions',
                  '/api/subjects/<int:subject_id>/chapters/<int:chapter_id>/quizzes/<int:quiz_id>/questions/<int:question_id>')
@@ -2,12 +2,14 @@ from models import db, User, Role, Subject, Chapter, Quiz, Question, Photo, Chat
 from flask_security.utils import hash_password
 from datetime import datetime
 from werkzeug.security import generate_password_hash
+from migrations import run_migrations
 def initialize_sample_data():
     """Initializes the database with sample data."""
     from main import app  # Import your Flask app instance
     with app.app_context():
-        # Create all tables
+        # Create all tables, then bring existing databases up to the latest schema
         db.create_all()
+        run_migrations()
 
         # Create roles if they don't exist
         if not Role.query.filter_by(name='admin').first():
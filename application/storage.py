@@ -0,0 +1,55 @@
+import os
+import shutil
+
+from flask import current_app
+
+from media import media_url
+
+
+class LocalStorage:
+    """Stores files under UPLOADED_VIDEOS_DEST and serves them through the uploaded_video route (fingerprinted)."""
+
+    def save(self, path, filename):
+        directory = current_app.config['UPLOADED_VIDEOS_DEST']
+        folder = os.path.join(current_app.root_path, directory)
+        os.makedirs(folder, exist_ok=True)
+        shutil.copyfile(path, os.path.join(folder, filename))
+        return media_url('/uploads/videos', directory, filename)
+
+
+class UploadcareStorage:
+    """Pushes files to Uploadcare and returns their CDN URL."""
+
+    def __init__(self):
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from pyuploadcare import Uploadcare
+            self._client = Uploadcare(
+                public_key=os.environ.get('UPLOADCARE_PUBLIC_KEY'),
+                secret_key=os.environ.get('UPLOADCARE_SECRET_KEY'),
+            )
+        return self._client
+
+    def save(self, path, filename):
+        with open(path, 'rb') as f:
+            uploaded = self.client.upload(f)
+        return uploaded.cdn_url
+
+
+STORAGE_BACKENDS = {
+    'local': LocalStorage,
+    'uploadcare': UploadcareStorage,
+}
+
+_backends = {}
+
+
+def recording_storage():
+    """Return the storage backend selected by RECORDING_STORAGE ('uploadcare' or 'local')."""
+    name = current_app.config.get('RECORDING_STORAGE', 'uploadcare')
+    if name not in _backends:
+        _backends[name] = STORAGE_BACKENDS[name]()
+    return _backends[name]
@@ -0,0 +1,180 @@
+import os
+import shutil
+from datetime import datetime, timedelta
+
+import pyexcel
+from celery import shared_task
+from flask import current_app
+from werkzeug.datastructures import MultiDict
+
+from cache import invalidate_tags
+from chunked_upload import expired_sessions
+from images import generate_variants, unreferenced_files, remove_file
+from models import db, Score, Photo, Question
+from anomalies import score_attempt_anomalies, finished_quiz_ids
+from reminders import daily_recipients, monthly_recipients, daily_message, monthly_message, send_reminders
+from resources import score_listing_query, SCORE_STREAM_CHUNK
+from storage import recording_storage
+
+EXPORT_COLUMNS = (
+    'id', 'quiz_id', 'quiz_name', 'user_id', 'user_email', 'time_stamp_of_attempt',
+    'total_scored', 'total_marks', 'remarks', 'tab_changes', 'time_took_to_attempt_test',
+    'duration_quiz', 'recording_url', 'flagged',
+)
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+
+def export_path(filename):
+    """Return the absolute path of an export file, creating the exports folder if needed."""
+    folder = os.path.join(current_app.root_path, current_app.config['EXPORTS_DEST'])
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, filename)
+
+
+@shared_task(bind=True, ignore_result=False)
+def export_scores(self, file_type='csv', filters=None):
+    """
+    Export scores joined with their user and quiz to a CSV/XLSX file.
+
+    Rows are read in chunks of SCORE_STREAM_CHUNK and streamed to disk, so
+    memory stays flat however many scores there are. Progress is reported
+    through the result backend as a PROGRESS state with 'done' and 'total'.
+    """
+    query = score_listing_query(MultiDict(filters or {}))
+    total = query.order_by(None).with_entities(db.func.count(Score.id)).scalar()
+    filename = f'scores-{self.request.id}.{file_type}'
+    path = export_path(filename)
+
+    def rows():
+        yield list(EXPORT_COLUMNS)
+        for done, row in enumerate(query.yield_per(SCORE_STREAM_CHUNK), start=1):
+            record = row._asdict()
+            yield [record[column] for column in EXPORT_COLUMNS]
+            if done % SCORE_STREAM_CHUNK == 0:
+                self.update_state(state='PROGRESS', meta={'done': done, 'total': total})
+
+    # Write to a temporary name so a half-written file is never served
+    partial_path = export_path(f'scores-{self.request.id}.partial.{file_type}')
+    pyexcel.isave_as(array=rows(), dest_file_name=partial_path)
+    pyexcel.free_resources()
+    os.replace(partial_path, path)
+    return {'filename': filename, 'done': total, 'total': total}
+
+
+RECORDING_RETRY_DELAY = 10  # seconds, doubled on every retry
+
+
+@shared_task(bind=True, ignore_result=False, max_retries=6)
+def upload_recording(self, user_id, quiz_id, spool_dir, files, recording_url=None):
+    """
+    Push a spooled quiz recording to the configured storage backend and record
+    its URLs on the user's Score.
+
+    Args:
+      files: Ordered mapping of kind ('video', 'audio') to file name in spool_dir.
+      recording_url: Set on retries once the files are uploaded, so only the
+        Score update is repeated.
+    """
+    countdown = RECORDING_RETRY_DELAY * 2 ** self.request.retries
+    if recording_url is None:
+        try:
+            storage = recording_storage()
+            recording_url = ", ".join(
+                f"{kind}:{storage.save(os.path.join(spool_dir, name), f'{self.request.id}-{name}')}"
+                for kind, name in files.items()
+            )
+        except Exception as e:
+            raise self.retry(exc=e, countdown=countdown)
+
+    score = Score.query.filter_by(user_id=user_id, quiz_id=quiz_id).first()
+    if score is None:
+        # The score submission may still be in flight when the upload finishes
+        raise self.retry(args=(user_id, quiz_id, spool_dir, files, recording_url), countdown=countdown)
+
+    score.recording_url = recording_url
+    db.session.commit()
+    shutil.rmtree(spool_dir, ignore_errors=True)
+    return {'recording_url': recording_url}
+
+
+@shared_task(ignore_result=False)
+def collect_expired_uploads():
+    """Delete resumable recording uploads abandoned for RECORDING_UPLOAD_TTL seconds."""
+    removed = 0
+    for path in expired_sessions(current_app.config['RECORDING_UPLOAD_TTL']):
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+    return {'removed': removed}
+
+
+@shared_task(ignore_result=False)
+def generate_photo_variants(photo_id):
+    """
+    Generate the resized derivatives of a question photo and record them on the Photo.
+
+    The variants are only written if the photo still has the content they were
+    made from, so a task for an image that was replaced meanwhile changes nothing.
+    """
+    photo = Photo.query.get(photo_id)
+    if photo is None or not photo.content_hash:
+        return None
+
+    content_hash = photo.content_hash
+    variants = generate_variants(content_hash, photo.photo_url)
+    updated = Photo.query.filter(Photo.id == photo_id, Photo.content_hash == content_hash).update(
+        {Photo.variants: variants}, synchronize_session=False
+    )
+    quiz_id = db.session.query(Question.quiz_id).filter(Question.id == photo.question_id).scalar()
+    db.session.commit()
+    if not updated:
+        return None
+    if quiz_id is not None:
+        invalidate_tags(f'questions:{quiz_id}')
+    return variants
+
+
+@shared_task(ignore_result=False)
+def collect_unreferenced_images(grace_seconds=3600):
+    """Delete stored originals and derivatives that no Photo references any more."""
+    referenced = {content_hash for content_hash, in db.session.query(Photo.content_hash).distinct()}
+    removed = 0
+    for path in unreferenced_files(referenced, grace_seconds):
+        remove_file(path)
+        removed += 1
+    return {'removed': removed}
+
+
+@shared_task(ignore_result=False)
+def daily_reminder(period=None):
+    """Remind inactive users and users with unattempted quizzes, at most once per day."""
+    period = period or datetime.utcnow().strftime('%Y-%m-%d')
+    sent = send_reminders('daily', period, daily_recipients(period), daily_message)
+    return {'period': period, 'sent': sent}
+
+
+@shared_task(ignore_result=False)
+def monthly_reminder(period=None):
+    """Send every user their activity report for the previous month, at most once per month."""
+    period = period or (datetime.utcnow().replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+    sent = send_reminders('monthly', period, monthly_recipients(period),
+                          lambda row: monthly_message(row, period))
+    return {'period': period, 'sent': sent}
+
+
+# Quiz windows that ended this recently are scored by score_finished_quizzes
+ANOMALY_LOOKBACK = timedelta(hours=1)
+
+
+@shared_task(ignore_result=False)
+def score_anomalies(quiz_ids=None):
+    """Recompute proctoring anomaly scores and automatic flags for some or all quizzes."""
+    return score_attempt_anomalies(quiz_ids)
+
+
+@shared_task(ignore_result=False)
+def score_finished_quizzes():
+    """Score the attempts of every quiz whose window closed within ANOMALY_LOOKBACK."""
+    quiz_ids = finished_quiz_ids(ANOMALY_LOOKBACK)
+    if not quiz_ids:
+        return {'quiz_ids': [], 'assessed': 0, 'anomalous': 0}
+    return dict(score_attempt_anomalies(quiz_ids), quiz_ids=quiz_ids)
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The application modules import each other as top-level modules
+sys.path.insert(0, APP_DIR)
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """The application on a fresh SQLite database with the sample data."""
+    os.environ['DATABASE_URL'] = f"sqlite:///{tmp_path_factory.mktemp('db') / 'app.db'}"
+    os.environ['CACHE_TYPE'] = 'SimpleCache'
+    os.environ.setdefault('SECRET_KEY', 'test-secret')
+    from main import app
+    from sample_data import initialize_sample_data
+    initialize_sample_data()
+    return app
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import event
+
+
+@pytest.fixture
+def count_queries(app):
+    from models import db
+
+    def count(callable_, *args, **kwargs):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            result = callable_(*args, **kwargs)
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        return result, statements
+
+    return count
+
+
+@pytest.fixture
+def quiz_with_photos(app):
+    from models import db, Chapter, Photo, Question, Quiz
+
+    with app.app_context():
+        quiz = Quiz(chapter_id=Chapter.query.first().id, time_duration='00:30', remarks='Query count quiz')
+        db.session.add(quiz)
+        db.session.flush()
+        for index in range(25):
+            question = Question(quiz_id=quiz.id, question_statement=f'Question {index}', option1='a',
+                                option2='b', option3='c', option4='d', correct_option=1 + index % 4)
+            db.session.add(question)
+            db.session.flush()
+            if index % 2 == 0:
+                db.session.add(Photo(question_id=question.id, photo_url=f'/uploads/images/{index}.png'))
+        db.session.commit()
+        yield quiz.id
+        Photo.query.filter(Photo.question_id.in_(db.session.query(Question.id).filter_by(quiz_id=quiz.id))).delete(
+            synchronize_session=False)
+        Question.query.filter_by(quiz_id=quiz.id).delete()
+        db.session.delete(quiz)
+        db.session.commit()
+
+
+def test_question_payload_is_a_single_query(app, count_queries, quiz_with_photos):
+    from resources import quiz_questions_payload
+
+    with app.app_context():
+        payload, statements = count_queries(quiz_questions_payload, quiz_with_photos, include_answers=False)
+
+    assert len(statements) == 1
+    assert len(payload) == 25
+    assert sum('photo_url' in question for question in payload) == 13
+    assert all('correct_option' not in question for question in payload)
+
+
+def test_single_question_payload_is_a_single_query(app, count_queries, quiz_with_photos):
+    from models import Question
+    from resources import quiz_questions_payload
+
+    with app.app_context():
+        question_id = Question.query.filter_by(quiz_id=quiz_with_photos).order_by(Question.id).first().id
+        payload, statements = count_queries(quiz_questions_payload, quiz_with_photos, question_id)
+
+    assert len(statements) == 1
+    assert [question['id'] for question in payload] == [question_id]
+    assert payload[0]['photo_url'] == '/uploads/images/0.png'
@@ -0,0 +1,150 @@
+"""
+Two-worker check of the Socket.IO message queue.
+
+Starts two application processes on the same database and message queue and
+asserts that a token issued by one of them is accepted by the other, and that
+a chat message sent to one reaches a client connected to the other.
+
+The workers use the broker in SOCKETIO_MESSAGE_QUEUE (e.g.
+redis://localhost:6379/4) when it is set. Otherwise a local Redis stand-in
+from fakeredis is started for the test.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from conftest import APP_DIR
+
+socketio = pytest.importorskip('socketio')
+pytest.importorskip('requests')  # HTTP transport of the Socket.IO client
+
+WORKER_SCRIPT = '''
+import os, sys
+from main import app, socketio
+if sys.argv[1] == 'init':
+    from sample_data import initialize_sample_data
+    initialize_sample_data()
+socketio.run(app, host='127.0.0.1', port=int(os.environ['PORT']), allow_unsafe_werkzeug=True)
+'''
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Worker exited with {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Worker on port {port} did not start')
+
+
+def _request(port, path, payload=None, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authentication-Token'] = token
+    request = urllib.request.Request(
+        f'http://127.0.0.1:{port}{path}', data=json.dumps(payload).encode() if payload is not None else None,
+        headers=headers,
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+@pytest.fixture(scope='module')
+def message_queue():
+    """The configured broker, or a local fakeredis server standing in for Redis."""
+    if os.environ.get('SOCKETIO_MESSAGE_QUEUE'):
+        yield os.environ['SOCKETIO_MESSAGE_QUEUE']
+        return
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('redis')  # Client the workers' message queue uses
+    server = fakeredis.TcpFakeServer(('127.0.0.1', _free_port()), server_type='redis')
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address
+        yield f'redis://{host}:{port}/0'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def workers(tmp_path, message_queue):
+    env = dict(
+        os.environ,
+        SOCKETIO_MESSAGE_QUEUE=message_queue,
+        DATABASE_URL=f"sqlite:///{tmp_path / 'app.db'}",
+        SECRET_KEY='two-worker-test-secret',
+        CACHE_TYPE='SimpleCache',
+        FLASK_DEBUG='0',
+    )
+    processes, ports = [], []
+    try:
+        # The first worker creates the schema before the second one starts
+        for mode in ('init', 'serve'):
+            port = _free_port()
+            process = subprocess.Popen(
+                [sys.executable, '-c', WORKER_SCRIPT, mode], cwd=APP_DIR, env=dict(env, PORT=str(port)),
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            processes.append(process)
+            _wait_for_port(port, process)
+            ports.append(port)
+        yield ports
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+def _chat_client(port, token, room):
+    client = socketio.Client()
+    joined = threading.Event()
+    received = []
+    client.on('new_message', received.append, namespace='/chat')
+    client.connect(f'http://127.0.0.1:{port}', namespaces=['/chat'], headers={'Authentication-Token': token})
+    client.emit('join', {'room': room}, namespace='/chat', callback=lambda *args: joined.set())
+    assert joined.wait(5), f"Could not join {room} on port {port}"
+    return client, received
+
+
+def test_token_and_room_message_work_across_workers(workers):
+    first, second = workers
+    _request(first, '/api/register', {
+        'email': 'candidate@example.com', 'password': 'password123', 'full_name': 'Candidate', 'dob': '2000-01-01',
+    })
+    # Each client logs in on one worker and only talks to the other
+    user = _request(first, '/api/login', {'email': 'candidate@example.com', 'password': 'password123'})
+    admin = _request(second, '/api/login', {'email': 'admin@example.com', 'password': 'adminpassword'})
+    assert _request(second, '/api/user/current_user_id', token=user['token']) == {'user_id': user['user_id']}
+    room = f"user_{user['user_id']}_admin"
+
+    listener, received = _chat_client(second, user['token'], room)
+    sender, _ = _chat_client(first, admin['token'], room)
+    try:
+        sender.emit('new_message', {'room': room, 'message': 'hello from the other worker'}, namespace='/chat')
+        deadline = time.monotonic() + 10
+        while not received and time.monotonic() < deadline:
+            time.sleep(0.1)
+    finally:
+        sender.disconnect()
+        listener.disconnect()
+
+    assert [message['message'] for message in received] == ['hello from the other worker']